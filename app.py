@@ -1,7 +1,10 @@
+import multiprocessing
 from flask import Flask
 from flask_cors import CORS
 from flask_swagger_ui import get_swaggerui_blueprint
-from routes.blueprints import blueprints_list
+from routes.blueprints import blueprints_list, serves_face
+from modules.face_worker_pool import get_face_pool
+from modules.roster_scheduler import get_roster_scheduler
 
 app = Flask(__name__)
 
@@ -15,6 +18,23 @@ swaggerui_bp = get_swaggerui_blueprint('/api-docs', '/static/swagger.yaml')
 for bp, url_prefix in blueprints_list:
     app.register_blueprint(bp, url_prefix=url_prefix)
 
+# PRELOAD FACE MODEL
+# Start the inference processes, each loads the recognition model and detector and runs a warmup inference.
+# Workers deployed without the face blueprints never start them.
+def init_face_services():
+    try:
+        get_face_pool().warmup()
+    except Exception as e:
+        print(f'Face engine warmup failed: {e}')
+
+    # Load each class's roster shortly before its session starts (see modules/roster_scheduler.py)
+    get_roster_scheduler().start()
+
+
+# The spawned inference processes re-import this module as __mp_main__, only the web process starts the services
+if serves_face and multiprocessing.parent_process() is None:
+    init_face_services()
+
 # Start a new command prompt and run the ngrok tunnel script
 # import subprocess
 # subprocess.Popen(['start', 'cmd', '/k', r'static\ngrok_tunnel.bat'], shell=True)
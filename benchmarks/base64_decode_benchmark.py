@@ -0,0 +1,90 @@
+"""
+Compare the chunked base64 decode into a per-thread buffer (ImageProcessor.decode_base64_buffer) with the
+previous base64.b64decode path, for JPEG payloads from 100 KB to 4 MB.
+
+For each payload size it reports the time of the base64 step alone and of the full decode (base64 + reduced
+cv2.imdecode), the peak memory Python allocates during the base64 step (tracemalloc) and how many decode
+buffers the new path had to allocate over all repetitions.
+
+Usage:
+    python -m benchmarks.base64_decode_benchmark --sizes-kb 100 500 1000 2000 4000 --repeat 50
+"""
+import argparse
+import base64
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from modules.facecheck import ImageProcessor, decode_buffer_allocations
+
+
+def synthetic_jpeg(target_bytes, rng):
+    # Noisy image resized until its JPEG lands near the target size; noise keeps the compression ratio low
+    side = 512
+    for _ in range(6):
+        image = rng.integers(0, 256, (side, side * 4 // 3, 3), dtype=np.uint8)
+        image = cv2.GaussianBlur(image, (3, 3), 0)
+        data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        side = max(16, int(side * (target_bytes / len(data)) ** 0.5))
+    return data
+
+
+def legacy_base64(image_base64):
+    # The previous path: an ASCII copy of the str and a payload-sized bytes object per frame
+    return memoryview(base64.b64decode(image_base64))
+
+
+def legacy_decode(image_base64):
+    return ImageProcessor.decode_bytes_reduced(legacy_base64(image_base64))
+
+
+def time_ms(function, payload, repeat):
+    function(payload)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(payload)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def peak_kb(function, payload):
+    # Peak Python-side allocation during one call, on top of what was already allocated
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = function(payload)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    del result
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes-kb', type=int, nargs='+', default=[100, 250, 500, 1000, 2000, 4000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f'{"payload":>9}{"b64 old":>10}{"b64 new":>10}{"full old":>10}{"full new":>10}'
+          f'{"peak old":>10}{"peak new":>10}{"buffers":>10}')
+    print(f'{"KB":>9}{"ms":>10}{"ms":>10}{"ms":>10}{"ms":>10}{"KB":>10}{"KB":>10}{"new":>10}')
+    for size_kb in args.sizes_kb:
+        jpeg = synthetic_jpeg(size_kb * 1024, rng)
+        payload = base64.b64encode(jpeg).decode('ascii')
+        allocations = decode_buffer_allocations.snapshot()
+        if bytes(ImageProcessor.decode_base64_buffer(payload)) != jpeg:
+            raise SystemExit(f'Decoded payload differs from the original at {size_kb} KB')
+        new_base64_ms = time_ms(ImageProcessor.decode_base64_buffer, payload, args.repeat)
+        new_full_ms = time_ms(ImageProcessor.decode_base64_reduced, payload, args.repeat)
+        # Buffers allocated over the 2 * (repeat + 1) + 1 decodes above; the old path allocates one per decode
+        allocations = f'{decode_buffer_allocations.snapshot() - allocations}/{2 * (args.repeat + 1) + 1}'
+
+        old_base64_ms = time_ms(legacy_base64, payload, args.repeat)
+        old_full_ms = time_ms(legacy_decode, payload, args.repeat)
+
+        print(f'{len(jpeg) / 1024:>9.0f}{old_base64_ms:>10.3f}{new_base64_ms:>10.3f}{old_full_ms:>10.2f}{new_full_ms:>10.2f}'
+              f'{peak_kb(legacy_base64, payload):>10.0f}{peak_kb(ImageProcessor.decode_base64_buffer, payload):>10.0f}'
+              f'{allocations:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Compare the embedding backends of modules/face_embedders.py (OpenCV DNN vs DeepFace) on a local image set.
+
+Every backend runs in its own interpreter so its import time and memory are measured from a clean process.
+Faces are detected and aligned once with the configured detector, then each backend embeds the same crops:
+one face at a time (request latency) and all at once (batched throughput). Agreement compares the two
+backends' embeddings of each face and the match decisions they take over every pair of faces.
+
+Usage:
+    python -m benchmarks.embedding_backend_benchmark --images ./faces --model SFace --repeat 3
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def list_images(directory):
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def run_backend(args):
+    # Child process: detect crops, load one backend, time it and save its embeddings to args.output
+    import cv2
+    from modules.facecheck import get_face_engine
+    from modules.face_embedders import get_embedder
+
+    engine = get_face_engine()
+    names, crops = [], []
+    for path in list_images(args.images):
+        image = cv2.imread(path)
+        crop = engine.detect_face(image) if image is not None else None
+        if crop is not None:
+            names.append(os.path.relpath(path, args.images))
+            crops.append(crop.image)
+    if not crops:
+        raise SystemExit(f'No detectable faces under {args.images}')
+    rss_crops = peak_rss_mb()
+
+    start = time.perf_counter()
+    embedder = get_embedder(args.model, args.backend)
+    embedder.embed(crops[:1])
+    load_seconds = time.perf_counter() - start
+
+    single_ms = []
+    for _ in range(args.repeat):
+        for crop in crops:
+            start = time.perf_counter()
+            embedder.embed([crop])
+            single_ms.append((time.perf_counter() - start) * 1000)
+
+    batch_ms = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        embeddings = embedder.embed(crops)
+        # Per face, comparable with the single-face latency
+        batch_ms.append((time.perf_counter() - start) * 1000 / len(crops))
+
+    np.save(args.output, np.stack(embeddings))
+    print(json.dumps({
+        'backend': embedder.name,
+        'names': names,
+        'load_seconds': load_seconds,
+        'single_p50_ms': float(np.percentile(single_ms, 50)),
+        'single_p95_ms': float(np.percentile(single_ms, 95)),
+        'batch_ms': float(np.median(batch_ms)),
+        # Growth attributable to the backend: imports, weights and inference buffers
+        'backend_rss_mb': peak_rss_mb() - rss_crops,
+        'peak_rss_mb': peak_rss_mb(),
+    }))
+
+
+def measure_backend(args, backend, output):
+    command = [sys.executable, '-m', 'benchmarks.embedding_backend_benchmark', '--worker', '--backend', backend,
+               '--output', output, '--images', args.images, '--model', args.model, '--repeat', str(args.repeat)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(f'{backend}: failed')
+        print(completed.stderr.strip())
+        return None
+    # The engine prints while loading, the result is the last line
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['embeddings'] = np.load(output)
+    return result
+
+
+def normalize_rows(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def print_agreement(first, second, threshold):
+    if first['names'] != second['names']:
+        print('Backends saw different faces, agreement skipped')
+        return
+    a, b = normalize_rows(first['embeddings']), normalize_rows(second['embeddings'])
+    if a.shape != b.shape:
+        print(f"Embedding sizes differ ({a.shape[1]} vs {b.shape[1]}), only decisions are compared")
+    else:
+        # Same face, two backends: how close the vectors themselves are
+        distances = 1.0 - np.sum(a * b, axis=1)
+        print(f'same-face cosine distance: mean {distances.mean():.4f}, max {distances.max():.4f}')
+
+    # Every pair of faces: does each backend take the same match decision at the model's threshold
+    pairs = np.triu_indices(len(a), k=1)
+    if not len(pairs[0]):
+        return
+    matches_a = (1.0 - (a @ a.T)[pairs]) <= threshold
+    matches_b = (1.0 - (b @ b.T)[pairs]) <= threshold
+    agreement = np.mean(matches_a == matches_b)
+    print(f'pair decisions: {agreement:.4f} agreement over {len(matches_a)} pairs '
+          f'({int(matches_a.sum())} vs {int(matches_b.sum())} matches)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True, help='directory of face images, searched recursively')
+    parser.add_argument('--model', default='SFace')
+    parser.add_argument('--backends', nargs='+', default=['opencv', 'deepface'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_backend(args)
+        return
+
+    from modules.facecheck import MODEL_THRESHOLDS
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in args.backends:
+            result = measure_backend(args, backend, os.path.join(directory, f'{backend}.npy'))
+            if result is not None:
+                results.append(result)
+
+    if not results:
+        return
+    print(f"{len(results[0]['names'])} faces, model {args.model}")
+    print(f'{"backend":<10}{"load s":>8}{"p50 ms":>9}{"p95 ms":>9}{"batch ms":>10}{"+RSS MB":>9}{"peak MB":>9}')
+    for result in results:
+        print(f"{result['backend']:<10}{result['load_seconds']:>8.2f}{result['single_p50_ms']:>9.2f}"
+              f"{result['single_p95_ms']:>9.2f}{result['batch_ms']:>10.2f}{result['backend_rss_mb']:>9.0f}"
+              f"{result['peak_rss_mb']:>9.0f}")
+    if len(results) == 2:
+        print_agreement(results[0], results[1], MODEL_THRESHOLDS[args.model])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare FaceIndex (IVF) against an exact brute-force scan on synthetic embeddings.
+
+Usage:
+    python -m benchmarks.face_index_benchmark --size 20000 --dim 512 --queries 500
+"""
+import argparse
+import time
+import numpy as np
+from modules.face_index import FaceIndex
+
+
+def synthetic_embeddings(size, dim, clusters, rng):
+    # Identities grouped around a few directions, roughly like faces sharing demographics/pose
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    members = centers[rng.integers(0, clusters, size)] + 0.8 * rng.standard_normal((size, dim)).astype(np.float32)
+    return members / np.linalg.norm(members, axis=1, keepdims=True)
+
+
+def noisy_queries(embeddings, count, noise, rng):
+    targets = rng.choice(len(embeddings), count, replace=False)
+    queries = embeddings[targets] + noise * rng.standard_normal((count, embeddings.shape[1])).astype(np.float32)
+    return targets, queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def time_per_query(search, queries):
+    start = time.perf_counter()
+    results = [search(query) for query in queries]
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--clusters', type=int, default=50)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--noise', type=float, default=0.03)
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = synthetic_embeddings(args.size, args.dim, args.clusters, rng)
+    targets, queries = noisy_queries(embeddings, args.queries, args.noise, rng)
+    ids = np.arange(args.size)
+
+    start = time.perf_counter()
+    index = FaceIndex()
+    index.add_many(ids, embeddings)
+    print(f'Built index over {args.size} x {args.dim} in {time.perf_counter() - start:.2f}s ({index.n_lists} lists)')
+
+    exact_ms, exact_results = time_per_query(lambda query: int(np.argmax(embeddings @ query)), queries)
+    exact_recall = np.mean(np.asarray(exact_results) == targets)
+    print(f'{"method":<16}{"ms/query":>10}{"recall@1":>10}{"speedup":>10}')
+    print(f'{"exact scan":<16}{exact_ms:>10.3f}{exact_recall:>10.3f}{1.0:>10.1f}')
+
+    for n_probe in args.n_probe:
+        ivf_ms, ivf_results = time_per_query(lambda query: index.search(query, k=1, n_probe=n_probe)[0][0], queries)
+        # Recall against the exact scan, i.e. how often the approximation returns the same neighbour
+        recall = np.mean(np.asarray(ivf_results) == np.asarray(exact_results))
+        print(f'{f"ivf n_probe={n_probe}":<16}{ivf_ms:>10.3f}{recall:>10.3f}{exact_ms / ivf_ms:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@ import psycopg2.extras
 import json
 from contextlib import contextmanager
 from datetime import time
+from modules.face_cache import class_rosters
 
 
 # Function to load database credentials from a JSON file
@@ -267,6 +268,9 @@ class ClassesDatabase:
                 cur.execute(query, (student_id, class_id))
                 conn.commit()
                 cur.close()
+
+                # A cached roster for the class no longer lists every student
+                class_rosters.pop(str(class_id))
                 return self.generate_response(success=True, error=None, status_code=201)
 
             except psycopg2.Error as e:
@@ -325,6 +329,8 @@ class ClassesDatabase:
                 conn.commit()
                 cur.close()
 
+                class_rosters.pop(str(class_id))
+
                 return self.generate_response(success=True, error=None, status_code=200, data={'student_id': deleted_student, 'class_id': deleted_class})
 
             except psycopg2.Error as e:
@@ -333,6 +339,26 @@ class ClassesDatabase:
                 print(f"Error deleting student from class: {error_message}")
                 return self.generate_response(success=False, error=error_message, status_code=500, error_code=e.pgcode)
 
+    # Method to list the classes with a schedule, used to pre-warm their face rosters before each session
+    def get_class_schedules(self):
+        with db_connection(self.credentials) as conn:
+            try:
+                cur = conn.cursor()
+                query = """
+                    SELECT class_id, start_time, end_time, week_days
+                    FROM classes
+                    WHERE start_time IS NOT NULL AND end_time IS NOT NULL AND week_days IS NOT NULL;
+                """
+                cur.execute(query)
+                schedules = cur.fetchall()
+                cur.close()
+                return self.generate_response(success=True, error=None, status_code=200, data={'schedules': schedules})
+
+            except psycopg2.Error as e:
+                error_message = e.pgerror if e.pgerror else str(e)
+                print(f"Error retrieving class schedules: {error_message}")
+                return self.generate_response(success=False, error=error_message, status_code=500, error_code=e.pgcode)
+
     def retrieve_class_exams(self, class_id):
         if not class_id:
             return self.generate_response(success=False, error='Class ID must be provided.', status_code=400)
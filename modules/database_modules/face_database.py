@@ -0,0 +1,262 @@
+import psycopg2
+import json
+from contextlib import contextmanager
+from modules.facecheck import MODEL_NAME, FaceCheck, FaceRoster
+from modules.face_templates import TEMPLATE_ENCODING, TEMPLATE_ENCODINGS
+from modules.face_cache import frame_token
+from modules.face_store import student_store
+
+# Function to load database credentials from a JSON file
+def load_credentials(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+# Context manager for database connection
+@contextmanager
+def db_connection(credentials):
+    conn = None
+    try:
+        conn = psycopg2.connect(
+            host=credentials['host'],
+            port=credentials['port'],
+            database=credentials['database'],
+            user=credentials['user'],
+            password=credentials['password']
+        )
+        yield conn
+    except psycopg2.DatabaseError as e:
+        print(f'Error connecting to the database: {e}')
+        raise e
+    finally:
+        if conn:
+            conn.close()
+
+# Database class to handle stored faces and their embeddings
+class FaceDatabase:
+    def __init__(self, credentials_path='modules/database_modules/credentials.json'):
+        self.credentials = load_credentials(credentials_path)
+
+    # Method to load the embeddings of every student enrolled in a class as a single roster matrix
+    def get_class_roster(self, class_id):
+        if not class_id:
+            return self.generate_response(success=False, error='Class ID must be provided.', status_code=400)
+
+        with db_connection(self.credentials) as conn:
+            try:
+                cur = conn.cursor()
+
+                # Check if the class exists
+                check_query = """
+                    SELECT 1 FROM classes
+                    WHERE class_id = %s;
+                """
+                cur.execute(check_query, (class_id,))
+                if not cur.fetchone():
+                    return self.generate_response(success=False, error='Class not found.', status_code=404)
+
+                # With the shared store mapped, only the ids travel from PostgreSQL and the templates are read
+                # from the memory-mapped file
+                store = student_store.current()
+                if store is not None and not store.holds(MODEL_NAME, TEMPLATE_ENCODINGS[TEMPLATE_ENCODING]):
+                    # Written before the model or the encoding changed, its rows can never be compared with this
+                    # model's embeddings: regenerate it and read PostgreSQL meanwhile
+                    student_store.request_rebuild(self.get_student_templates)
+                    store = None
+                if store is not None:
+                    ids_query = """
+                        SELECT cs.student_id
+                        FROM classes_students cs
+                        JOIN faces_students f ON f.student_id = cs.student_id
+                        WHERE cs.class_id = %s AND f.face_embedding IS NOT NULL;
+                    """
+                    cur.execute(ids_query, (class_id,))
+                    student_ids = [row[0] for row in cur.fetchall()]
+                    positions, found = store.lookup(student_ids)
+                    stored_ids = [student_id for student_id, hit in zip(student_ids, found) if hit]
+                    missing_ids = [student_id for student_id, hit in zip(student_ids, found) if not hit]
+
+                    # Students missing from this generation either stored their template after it was written, or
+                    # hold one of another model that can never enter the store; only the first kind needs a rebuild
+                    rows = []
+                    if missing_ids:
+                        missing_query = """
+                            SELECT f.student_id, f.face_embedding
+                            FROM faces_students f
+                            WHERE f.student_id = ANY(%s) AND f.face_embedding IS NOT NULL;
+                        """
+                        cur.execute(missing_query, (missing_ids,))
+                        rows = [(row[0], FaceCheck.repack_template(row[1])) for row in cur.fetchall()]
+                        rows = [row for row in rows if row[1] is not None]
+                        if rows:
+                            student_store.request_rebuild(self.get_student_templates)
+                    cur.close()
+
+                    templates = store.templates.take(positions[found])
+                    if rows:
+                        stored_templates = list(templates.buffer) if templates.buffer is not None else []
+                        roster = FaceRoster(stored_ids + [row[0] for row in rows], stored_templates + [row[1] for row in rows])
+                    else:
+                        roster = FaceRoster.from_matrix(stored_ids, templates)
+                    if not len(roster):
+                        return self.generate_response(success=False, error='No enrolled faces found for the class.', status_code=404)
+                    return self.generate_response(success=True, error=None, status_code=200, data={'roster': roster})
+
+                query = """
+                    SELECT cs.student_id, f.face_embedding
+                    FROM classes_students cs
+                    JOIN faces_students f ON f.student_id = cs.student_id
+                    WHERE cs.class_id = %s AND f.face_embedding IS NOT NULL;
+                """
+                cur.execute(query, (class_id,))
+                rows = cur.fetchall()
+                cur.close()
+
+                if not rows:
+                    return self.generate_response(success=False, error='No enrolled faces found for the class.', status_code=404)
+
+                # No usable store mapped yet, have one generated
+                student_store.request_rebuild(self.get_student_templates)
+
+                # Templates stay packed, the roster compares against them without expanding to float32
+                roster = FaceRoster([row[0] for row in rows], [row[1] for row in rows])
+                if not len(roster):
+                    # Every stored template belongs to another model or cannot be decoded
+                    return self.generate_response(success=False, error='No enrolled faces found for the class.', status_code=404)
+                return self.generate_response(success=True, error=None, status_code=200, data={'roster': roster})
+
+            except psycopg2.Error as e:
+                error_message = e.pgerror if e.pgerror else str(e)
+                print(f"Error retrieving class roster: {error_message}")
+                return self.generate_response(success=False, error=error_message, status_code=500, error_code=e.pgcode)
+
+    # Method to load the stored embeddings of the students of a faculty whose face row is newer than
+    # after_face_id, used to build and catch up its FaceIndex. last_face_id is the newest face row read.
+    def get_faculty_embeddings(self, faculty, after_face_id=0):
+        with db_connection(self.credentials) as conn:
+            try:
+                cur = conn.cursor()
+                query = """
+                    SELECT f.face_id, f.student_id, f.face_embedding
+                    FROM faces_students f
+                    JOIN users_students u ON u.id = f.student_id
+                    WHERE u.faculty = %s AND f.face_embedding IS NOT NULL AND f.face_id > %s
+                    ORDER BY f.face_id;
+                """
+                cur.execute(query, (faculty, after_face_id))
+                fetched = cur.fetchall()
+                cur.close()
+                rows = [(row[1], FaceCheck.deserialize_embedding(row[2])) for row in fetched]
+                rows = [row for row in rows if row[1] is not None]
+
+                return self.generate_response(
+                    success=True,
+                    error=None,
+                    status_code=200,
+                    data={
+                        'student_ids': [row[0] for row in rows],
+                        'embeddings': [row[1] for row in rows],
+                        'last_face_id': fetched[-1][0] if fetched else after_face_id
+                    }
+                )
+
+            except psycopg2.Error as e:
+                error_message = e.pgerror if e.pgerror else str(e)
+                print(f"Error retrieving faculty embeddings: {error_message}")
+                return self.generate_response(success=False, error=error_message, status_code=500, error_code=e.pgcode)
+
+    # Loader for the shared embedding store: every student's template, repacked to the current encoding.
+    # Raises on database errors so a failed rebuild never replaces the current file.
+    def get_student_templates(self):
+        with db_connection(self.credentials) as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT f.student_id, f.face_embedding
+                FROM faces_students f
+                WHERE f.face_embedding IS NOT NULL;
+            """
+            cur.execute(query)
+            rows = [(row[0], FaceCheck.repack_template(row[1])) for row in cur.fetchall()]
+            cur.close()
+
+        rows = [row for row in rows if row[1] is not None]
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    # Method to load the stored embeddings of the students whose face row is newer than after_face_id, used to
+    # detect duplicate identities at signup. last_face_id is the newest face row read, usable or not.
+    def get_student_embeddings(self, after_face_id=0):
+        with db_connection(self.credentials) as conn:
+            try:
+                cur = conn.cursor()
+                query = """
+                    SELECT f.face_id, f.student_id, f.face_embedding
+                    FROM faces_students f
+                    WHERE f.face_embedding IS NOT NULL AND f.face_id > %s
+                    ORDER BY f.face_id;
+                """
+                cur.execute(query, (after_face_id,))
+                fetched = cur.fetchall()
+                cur.close()
+                rows = [(row[1], FaceCheck.deserialize_embedding(row[2])) for row in fetched]
+                rows = [row for row in rows if row[1] is not None]
+
+                return self.generate_response(
+                    success=True,
+                    error=None,
+                    status_code=200,
+                    data={
+                        'student_ids': [row[0] for row in rows],
+                        'embeddings': [row[1] for row in rows],
+                        'last_face_id': fetched[-1][0] if fetched else after_face_id
+                    }
+                )
+
+            except psycopg2.Error as e:
+                error_message = e.pgerror if e.pgerror else str(e)
+                print(f"Error retrieving student embeddings: {error_message}")
+                return self.generate_response(success=False, error=error_message, status_code=500, error_code=e.pgcode)
+
+    # Method to fetch the reference faces of many students with a single query
+    def get_faces_by_student_ids(self, student_ids):
+        if not student_ids:
+            return self.generate_response(success=False, error='Student IDs must be provided.', status_code=400)
+
+        with db_connection(self.credentials) as conn:
+            try:
+                cur = conn.cursor()
+                query = """
+                    SELECT f.student_id, f.face_img, f.face_embedding
+                    FROM faces_students f
+                    WHERE f.student_id = ANY(%s);
+                """
+                cur.execute(query, (list(student_ids),))
+                rows = cur.fetchall()
+                cur.close()
+
+                faces = {}
+                for student_id, face_img, face_embedding in rows:
+                    if not face_img:
+                        continue
+                    face_img_bytes = bytes(face_img) if isinstance(face_img, memoryview) else face_img
+                    faces[student_id] = {
+                        'face_img_base64': face_img_bytes.decode('utf-8') if isinstance(face_img_bytes, bytes) else face_img_bytes,
+                        'face_embedding': FaceCheck.deserialize_embedding(face_embedding),
+                        'face_hash': frame_token(face_img_bytes + bytes(face_embedding or b''))
+                    }
+
+                return self.generate_response(success=True, error=None, status_code=200, data=faces)
+
+            except psycopg2.Error as e:
+                error_message = e.pgerror if e.pgerror else str(e)
+                print(f"Error retrieving student faces: {error_message}")
+                return self.generate_response(success=False, error=error_message, status_code=500, error_code=e.pgcode)
+
+    # Private method to generate a consistent JSON response
+    @staticmethod
+    def generate_response(success, error=None, status_code=200, **kwargs):
+        response = {
+            'success': success,
+            'error': error,
+            'status_code': status_code
+        }
+        response.update(kwargs)
+        return response
@@ -1,7 +1,20 @@
 import psycopg2
 import json
 import base64
+import os
 from contextlib import contextmanager
+from modules.facecheck import MODEL_NAME, MODEL_THRESHOLDS, FaceCheck, ImageProcessor
+from modules.face_index import STUDENTS_INDEX_KEY, faculty_indexes, student_indexes
+from modules.face_worker_pool import get_face_pool
+from modules.face_cache import frame_token
+from modules.face_store import student_store
+from modules.database_modules.face_database import FaceDatabase
+
+# Cosine distance under which a signup face is considered the same person as an enrolled student, as a fraction
+# of MODEL_NAME's verification threshold so it stays stricter for every model: two different people must not
+# collide here.
+DUPLICATE_FACE_RATIO = float(os.environ.get('FACECHECK_DUPLICATE_FACE_RATIO', 0.5))
+DUPLICATE_FACE_DISTANCE = MODEL_THRESHOLDS[MODEL_NAME] * DUPLICATE_FACE_RATIO
 
 # Function to load database credentials from a JSON file
 def load_credentials(path):
@@ -42,6 +55,20 @@ class LoginSignupDatabase:
         face_img = kwargs.pop('face_img', None)
         print("Student signup data:", kwargs)  # Debugging print
 
+        # Crop and embed the reference face before opening the connection so inference does not hold it
+        face_img, face_embedding = self.prepare_face_reference(face_img) if face_img else (face_img, None)
+
+        # One person must not be able to hold two student accounts
+        duplicate_id = self.find_duplicate_student_face(face_embedding)
+        if duplicate_id is not None:
+            print(f'Face already registered to student {duplicate_id}')  # Debugging print
+            return self.generate_response(
+                success=False,
+                error='This face is already registered to another account.',
+                status_code=409,
+                duplicate_field='face_img'
+            )
+
         with db_connection(self.credentials) as conn:
             try:
                 cur = conn.cursor()
@@ -63,9 +90,9 @@ class LoginSignupDatabase:
                 if face_img:
                     print("Inserting face image")  # Debugging print
                     face_query = """
-                        INSERT INTO faces_students (student_id, face_img) VALUES (%s, %s) RETURNING face_id;
+                        INSERT INTO faces_students (student_id, face_img, face_embedding) VALUES (%s, %s, %s) RETURNING face_id;
                     """
-                    cur.execute(face_query, (student_id, face_img))
+                    cur.execute(face_query, (student_id, face_img, FaceCheck.serialize_embedding(face_embedding)))
                     print("Face image inserted")  # Debugging print
                     face_id = cur.fetchone()[0]
                     print("Inserted face ID:", face_id)  # Debugging print
@@ -79,6 +106,14 @@ class LoginSignupDatabase:
 
                 conn.commit()
                 cur.close()
+
+                # Keep the faculty index (if this worker already built it) in sync with the new signup
+                if face_embedding is not None:
+                    faculty_indexes.add(kwargs['faculty'], student_id, face_embedding)
+                    student_indexes.add(STUDENTS_INDEX_KEY, student_id, face_embedding)
+                    # New signups reach the shared store (and every worker's rosters) with the next rebuild
+                    student_store.request_rebuild(FaceDatabase().get_student_templates)
+
                 return self.generate_response(success=True, error=None, status_code=201, student_id=student_id)
 
             except psycopg2.Error as e:
@@ -106,6 +141,9 @@ class LoginSignupDatabase:
         face_img = kwargs.pop('face_img', None)
         print("Teacher signup data:", kwargs)  # Debugging print
 
+        # Crop and embed the reference face before opening the connection so inference does not hold it
+        face_img, face_embedding = self.prepare_face_reference(face_img) if face_img else (face_img, None)
+
         with db_connection(self.credentials) as conn:
             try:
                 cur = conn.cursor()
@@ -126,9 +164,9 @@ class LoginSignupDatabase:
                 if face_img:
                     print("Inserting face image")  # Debugging print
                     face_query = """
-                        INSERT INTO faces_teachers (teacher_id, face_img) VALUES (%s, %s) RETURNING face_id;
+                        INSERT INTO faces_teachers (teacher_id, face_img, face_embedding) VALUES (%s, %s, %s) RETURNING face_id;
                     """
-                    cur.execute(face_query, (teacher_id, face_img))
+                    cur.execute(face_query, (teacher_id, face_img, FaceCheck.serialize_embedding(face_embedding)))
                     print("Face image inserted")
                     face_id = cur.fetchone()[0]
                     print("Inserted face ID:", face_id)  # Debugging print
@@ -275,7 +313,7 @@ class LoginSignupDatabase:
             try:
                 cur = conn.cursor()
                 query = """
-                    SELECT f.face_img
+                    SELECT f.face_img, f.face_embedding
                     FROM faces_students f
                     WHERE f.student_id = %s
                 """
@@ -297,7 +335,11 @@ class LoginSignupDatabase:
 
                     return self.generate_response(
                         success=True,
-                        data={'face_img_base64': face_img_bytes.decode('utf-8') if isinstance(face_img_bytes, bytes) else face_img_bytes},
+                        data={
+                            'face_img_base64': face_img_bytes.decode('utf-8') if isinstance(face_img_bytes, bytes) else face_img_bytes,
+                            'face_embedding': FaceCheck.deserialize_embedding(result[1]),
+                            'face_hash': frame_token(face_img_bytes + bytes(result[1] or b''))
+                        },
                         status_code=200
                     )
                 else:
@@ -314,6 +356,41 @@ class LoginSignupDatabase:
                     status_code=500
                 )
 
+    # Search every enrolled student's embedding (IVF index, sub-linear) for the same face, returns its student_id
+    @staticmethod
+    def find_duplicate_student_face(face_embedding):
+        if face_embedding is None:
+            return None
+        # Catches up with the signups other workers stored since the last check, one indexed query. Failures
+        # propagate: a signup is never accepted without the duplicate check having run.
+        index = student_indexes.catch_up(STUDENTS_INDEX_KEY, LoginSignupDatabase.load_student_embeddings)
+        nearest = index.search(face_embedding, k=1)
+
+        if nearest and 1.0 - nearest[0][1] <= DUPLICATE_FACE_DISTANCE:
+            return nearest[0][0]
+        return None
+
+    @staticmethod
+    def load_student_embeddings(after_face_id):
+        db_result = FaceDatabase().get_student_embeddings(after_face_id)
+        if not db_result['success']:
+            raise RuntimeError(db_result['error'])
+        data = db_result['data']
+        return data['student_ids'], data['embeddings'], data['last_face_id']
+
+    # Store the canonical face crop and its embedding once at signup so verification only embeds the captured frame
+    @staticmethod
+    def prepare_face_reference(face_img):
+        # Invalid images and a busy or slow pool propagate (400/429/503 from the route); only an image without a
+        # detectable face is accepted as is, and verification then falls back to comparing both images
+        face_img_base64 = face_img.decode('utf-8') if isinstance(face_img, bytes) else face_img
+        image, _ = ImageProcessor.decode_base64_reduced(face_img_base64)
+        face_crop, face_embedding = get_face_pool().run('prepare_reference', image)
+        if face_crop is None:
+            print('No face detected in the signup image')  # Debugging print
+            return face_img, None
+        return base64.b64encode(ImageProcessor.encode_binary(face_crop)).decode('utf-8'), face_embedding
+
     # Private method to generate a consistent JSON response
     @staticmethod
     def generate_response(success, error=None, status_code=200, **kwargs):
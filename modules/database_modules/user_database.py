@@ -9,6 +9,7 @@ import psycopg2
 import psycopg2.extras
 import json
 from contextlib import contextmanager
+from modules.face_index import faculty_indexes
 
 
 def load_db_credentials(path):
@@ -281,6 +282,12 @@ class UserDatabase:
                         status_code=404
                     )
 
+                # A student moving faculty leaves this worker's indexes right away; other workers (core ones never
+                # hold any) pick the move up when their index is rebuilt after FACECHECK_INDEX_MAX_AGE
+                if user_type == 'student' and 'faculty' in filtered_kwargs:
+                    faculty_indexes.remove(int(user_id))
+                    faculty_indexes.drop(filtered_kwargs['faculty'])
+
                 return self.generate_response(
                     success=True,
                     data={'message': f"{user_type.capitalize()} information updated successfully"},
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from modules.face_metrics import metrics
+
+# Verification results are reused for retried requests within this window
+VERIFY_CACHE_SIZE = int(os.environ.get('FACECHECK_VERIFY_CACHE_SIZE', 1024))
+VERIFY_CACHE_TTL = float(os.environ.get('FACECHECK_VERIFY_CACHE_TTL', 300))
+# Class rosters loaded on demand stay this long; pre-warmed ones stay until their session ends
+ROSTER_CACHE_SIZE = int(os.environ.get('FACECHECK_ROSTER_CACHE_SIZE', 256))
+ROSTER_CACHE_TTL = float(os.environ.get('FACECHECK_ROSTER_CACHE_TTL', 600))
+
+
+class TTLCache:
+    # Bounded LRU cache whose entries also expire ttl seconds after being stored; hits and misses
+    # are counted in the metrics registry as <name>_cache_hits_total / <name>_cache_misses_total
+    def __init__(self, name, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = metrics.counter(f'{name}_cache_hits_total')
+        self.misses = metrics.counter(f'{name}_cache_misses_total')
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses.inc()
+                return None
+            self.entries.move_to_end(key)
+            self.hits.inc()
+            return entry[1]
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        # ttl overrides the cache's default for this entry
+        with self.lock:
+            self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def contains(self, key):
+        # Unexpired entry present, without counting a hit or miss
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def purge_expired(self):
+        # Expired entries are otherwise only dropped when looked up or pushed out by newer ones
+        now = time.monotonic()
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[0] < now]:
+                del self.entries[key]
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            return entry[1] if entry else None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def frame_token(frame_payload):
+    # Short, stable key for a frame or stored face payload (base64 str or raw bytes)
+    if isinstance(frame_payload, str):
+        frame_payload = frame_payload.encode('ascii', 'ignore')
+    return hashlib.blake2b(frame_payload, digest_size=16).hexdigest()
+
+
+# Aligned crops from /api/face/check-existing, reused by /api/face/verify for the same frame
+face_crops = TTLCache('face_crop', maxsize=256, ttl=120)
+
+# Match results keyed by (captured frame hash, reference face hash). The reference hash covers the stored
+# face image and template, so a changed face in faces_students never hits an old entry.
+verification_results = TTLCache('face_verify', maxsize=VERIFY_CACHE_SIZE, ttl=VERIFY_CACHE_TTL)
+
+# FaceRoster per class (keyed by str(class_id)), pre-warmed from class schedules by modules/roster_scheduler.py
+class_rosters = TTLCache('class_roster', maxsize=ROSTER_CACHE_SIZE, ttl=ROSTER_CACHE_TTL)
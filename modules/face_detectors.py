@@ -0,0 +1,145 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+# 'auto' picks the most accurate available detector that fits FACE_DETECTOR_BUDGET_MS
+FACE_DETECTOR = os.environ.get('FACECHECK_FACE_DETECTOR', 'auto')
+FACE_DETECTOR_BUDGET_MS = float(os.environ.get('FACECHECK_DETECTOR_BUDGET_MS', 30))
+# Directory holding the optional DNN detector weights
+MODELS_DIR = os.environ.get('FACECHECK_MODELS_DIR', 'models')
+
+
+class HaarDetector:
+    name = 'haarcascade'
+    # Rough single-core latency on a 640px frame, used to pick a detector for a latency budget
+    latency_ms = 25
+    accuracy_rank = 1
+
+    def __init__(self):
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        # detectMultiScale writes to the classifier's feature evaluator, so calls are serialized
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return True
+
+    def detect(self, image):
+        # [(box, eyes)] largest face first; eyes is ((x, y), (x, y)) left to right, or None
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        with self.lock:
+            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+            boxes = sorted((tuple(int(value) for value in face) for face in faces), key=lambda box: box[2] * box[3], reverse=True)
+            # Eyes are only located for the largest face, the one the pipeline aligns
+            eyes = self.locate_eyes(gray, boxes[0]) if boxes else None
+        return [(box, eyes) for box in boxes[:1]] + [(box, None) for box in boxes[1:]]
+
+    def locate_eyes(self, gray, box):
+        x, y, w, h = box
+        upper_face = gray[y:y + h // 2, x:x + w]
+        eyes = self.eye_cascade.detectMultiScale(upper_face, scaleFactor=1.1, minNeighbors=5, minSize=(w // 10, h // 10))
+        if len(eyes) < 2:
+            return None
+
+        eyes = sorted(eyes, key=lambda eye: eye[2] * eye[3], reverse=True)[:2]
+        centres = sorted((x + ex + ew / 2, y + ey + eh / 2) for ex, ey, ew, eh in eyes)
+        return centres[0], centres[1]
+
+
+class SsdDetector:
+    name = 'ssd'
+    latency_ms = 20
+    accuracy_rank = 2
+    prototxt = 'deploy.prototxt'
+    weights = 'res10_300x300_ssd_iter_140000.caffemodel'
+    confidence_threshold = 0.5
+
+    def __init__(self):
+        self.net = cv2.dnn.readNetFromCaffe(os.path.join(MODELS_DIR, self.prototxt), os.path.join(MODELS_DIR, self.weights))
+        # cv2.dnn.Net keeps per-inference state, so calls are serialized
+        self.lock = threading.Lock()
+
+    @classmethod
+    def available(cls):
+        return all(os.path.isfile(os.path.join(MODELS_DIR, name)) for name in (cls.prototxt, cls.weights))
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        with self.lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()[0, 0]
+
+        boxes = []
+        for detection in detections[detections[:, 2] >= self.confidence_threshold]:
+            x1, y1, x2, y2 = (detection[3:7] * np.array([width, height, width, height])).astype(int)
+            x1, y1 = max(x1, 0), max(y1, 0)
+            if x2 > x1 and y2 > y1:
+                boxes.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+        boxes.sort(key=lambda box: box[2] * box[3], reverse=True)
+        return [(box, None) for box in boxes]
+
+
+class YuNetDetector:
+    name = 'yunet'
+    latency_ms = 8
+    accuracy_rank = 3
+    weights = 'face_detection_yunet_2023mar.onnx'
+    score_threshold = 0.8
+
+    def __init__(self):
+        self.detector = cv2.FaceDetectorYN.create(os.path.join(MODELS_DIR, self.weights), '', (320, 320), self.score_threshold)
+        # setInputSize mutates the detector, so calls are serialized
+        self.lock = threading.Lock()
+
+    @classmethod
+    def available(cls):
+        return hasattr(cv2, 'FaceDetectorYN') and os.path.isfile(os.path.join(MODELS_DIR, cls.weights))
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        with self.lock:
+            self.detector.setInputSize((width, height))
+            _, faces = self.detector.detect(image)
+
+        results = []
+        for face in faces if faces is not None else []:
+            box = tuple(int(value) for value in face[:4])
+            # Landmarks 0 and 1 are the two eyes
+            eyes = tuple(sorted(((float(face[4]), float(face[5])), (float(face[6]), float(face[7])))))
+            results.append((box, eyes))
+        results.sort(key=lambda result: result[0][2] * result[0][3], reverse=True)
+        return results
+
+
+DETECTORS = {detector.name: detector for detector in (HaarDetector, SsdDetector, YuNetDetector)}
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+def select_detector(budget_ms=FACE_DETECTOR_BUDGET_MS):
+    # Most accurate available detector within the budget, or the fastest available one if none fits
+    available = [detector for detector in DETECTORS.values() if detector.available()]
+    within_budget = [detector for detector in available if detector.latency_ms <= budget_ms]
+    if within_budget:
+        return max(within_budget, key=lambda detector: detector.accuracy_rank).name
+    return min(available, key=lambda detector: detector.latency_ms).name
+
+
+def get_detector(name=FACE_DETECTOR):
+    # One instance per detector per process, shared across request threads
+    if name == 'auto':
+        name = select_detector()
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector '{name}', expected one of: {', '.join(DETECTORS)}")
+
+    detector = _detectors.get(name)
+    if detector is None:
+        with _detectors_lock:
+            detector = _detectors.get(name)
+            if detector is None:
+                detector = _detectors[name] = DETECTORS[name]()
+    return detector
@@ -0,0 +1,102 @@
+import importlib.util
+import json
+import os
+import threading
+import cv2
+import numpy as np
+from modules.face_detectors import MODELS_DIR
+
+# 'auto' uses the OpenCV backend for every model whose ONNX weights are present and DeepFace for the rest
+EMBEDDING_BACKEND = os.environ.get('FACECHECK_EMBEDDING_BACKEND', 'auto')
+# ONNX weights per model for the OpenCV backend, relative to MODELS_DIR unless absolute,
+# e.g. '{"SFace": "/opt/models/sface.onnx"}' to load them from another location
+ONNX_MODELS = {
+    'SFace': 'face_recognition_sface_2021dec.onnx',
+}
+ONNX_MODELS.update(json.loads(os.environ.get('FACECHECK_ONNX_MODELS', '{}')))
+
+
+def load_deepface():
+    # DeepFace pulls in TensorFlow (seconds and hundreds of MB), so it is only imported once a model is needed.
+    # Web workers hand inference to the pool processes and never import it at all.
+    from deepface import DeepFace
+    return DeepFace
+
+
+class DeepFaceEmbedder:
+    name = 'deepface'
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        load_deepface().build_model(model_name)
+
+    @staticmethod
+    def available(model_name):
+        return importlib.util.find_spec('deepface') is not None
+
+    def embed(self, crops):
+        # Crops come from detect_face, so DeepFace's own detector is skipped
+        results = load_deepface().represent(list(crops), model_name=self.model_name, detector_backend='skip', enforce_detection=False)
+        if len(crops) == 1:
+            results = [results]
+        return [np.asarray(result[0]['embedding'], dtype=np.float32) for result in results]
+
+
+class OpenCVEmbedder:
+    name = 'opencv'
+    # Input side of the ONNX recognition models; SFace takes 112x112 RGB pixels in the 0-255 range
+    input_size = 112
+
+    def __init__(self, model_name):
+        if model_name not in ONNX_MODELS:
+            raise ValueError(f"No ONNX weights configured for the '{model_name}' model")
+        self.model_name = model_name
+        self.net = cv2.dnn.readNetFromONNX(self.model_path(model_name))
+        # cv2.dnn.Net keeps per-inference state, so calls are serialized
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def model_path(model_name):
+        return os.path.join(MODELS_DIR, ONNX_MODELS[model_name])
+
+    @classmethod
+    def available(cls, model_name):
+        return model_name in ONNX_MODELS and os.path.isfile(cls.model_path(model_name))
+
+    def embed(self, crops):
+        # Crops are BGR like every decoded frame; the whole batch goes through one forward pass
+        blob = cv2.dnn.blobFromImages(list(crops), 1.0, (self.input_size, self.input_size), (0, 0, 0), swapRB=True, crop=False)
+        with self.lock:
+            self.net.setInput(blob)
+            features = self.net.forward()
+        return list(features.reshape(len(crops), -1).astype(np.float32, copy=False))
+
+
+EMBEDDERS = {embedder.name: embedder for embedder in (DeepFaceEmbedder, OpenCVEmbedder)}
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def select_embedder(model_name):
+    # OpenCV when it can serve the model, so a deployment with only ONNX models never imports TensorFlow
+    if OpenCVEmbedder.available(model_name):
+        return OpenCVEmbedder.name
+    return DeepFaceEmbedder.name
+
+
+def get_embedder(model_name, backend=EMBEDDING_BACKEND):
+    # One instance per backend and model per process, shared across request threads
+    if backend == 'auto':
+        backend = select_embedder(model_name)
+    if backend not in EMBEDDERS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of: auto, {', '.join(EMBEDDERS)}")
+
+    key = (backend, model_name)
+    embedder = _embedders.get(key)
+    if embedder is None:
+        with _embedders_lock:
+            embedder = _embedders.get(key)
+            if embedder is None:
+                embedder = _embedders[key] = EMBEDDERS[backend](model_name)
+    return embedder
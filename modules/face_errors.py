@@ -0,0 +1,34 @@
+from flask import jsonify
+from modules.facecheck import FaceQualityError
+from modules.face_worker_pool import FaceQueueFullError, FaceTimeoutError
+
+# Errors of the face services that reach the client as a 4xx/503 instead of a 500
+FACE_SERVICE_ERRORS = (FaceQualityError, FaceQueueFullError, FaceTimeoutError)
+
+
+def face_error_response(error):
+    """
+    Response for one of FACE_SERVICE_ERRORS, shared by every face route:
+
+    - FaceQualityError: 400, the reason tells the app what to ask the user to fix.
+    - FaceQueueFullError: 429, the pool is saturated.
+    - FaceTimeoutError: 503, the pool did not answer in time.
+
+    Both pool errors carry a Retry-After header so clients back off instead of retrying at once.
+    """
+    if isinstance(error, FaceQualityError):
+        return jsonify({
+            'success': False,
+            'error': str(error),
+            'status_code': 400,
+            'reason': error.reason
+        }), 400
+
+    status_code = 429 if isinstance(error, FaceQueueFullError) else 503
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'status_code': status_code
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, status_code
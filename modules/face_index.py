@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+import numpy as np
+from modules.face_templates import quantize
+
+# Seconds after which a registry index is rebuilt from the database instead of only catching up with new rows
+INDEX_MAX_AGE = float(os.environ.get('FACECHECK_INDEX_MAX_AGE', 600))
+
+
+class _InvertedList:
+    # Contiguous ids and int8-quantized vectors (codes * scale) for one IVF cell,
+    # grown by doubling so inserts are amortized O(1)
+    def __init__(self, dim):
+        self.ids = np.empty(16, dtype=np.int64)
+        self.codes = np.empty((16, dim), dtype=np.int8)
+        self.scales = np.empty(16, dtype=np.float32)
+        self.size = 0
+
+    def append(self, face_id, vector):
+        if self.size == len(self.ids):
+            self.ids = np.resize(self.ids, 2 * self.size)
+            self.codes = np.resize(self.codes, (2 * self.size, self.codes.shape[1]))
+            self.scales = np.resize(self.scales, 2 * self.size)
+        self.ids[self.size] = face_id
+        self.codes[self.size], self.scales[self.size] = quantize(vector)
+        self.size += 1
+        return self.size - 1
+
+    def scores(self, query):
+        return (self.codes[:self.size].astype(np.float32) @ query) * self.scales[:self.size]
+
+    def vectors(self):
+        return self.codes[:self.size].astype(np.float32) * self.scales[:self.size, None]
+
+    def remove(self, position):
+        # Swap the last entry into the hole; returns the id that moved so the caller can fix its position
+        last = self.size - 1
+        moved_id = None
+        if position != last:
+            self.ids[position] = self.ids[last]
+            self.codes[position] = self.codes[last]
+            self.scales[position] = self.scales[last]
+            moved_id = int(self.ids[position])
+        self.size -= 1
+        return moved_id
+
+
+class FaceIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index over L2-normalized face embeddings.
+
+    Vectors are bucketed under their closest k-means centroid. A search only scores the
+    n_probe buckets whose centroids are closest to the query, so n_probe is the recall/latency
+    knob: n_probe == n_lists is an exact scan. Below train_threshold vectors the index keeps
+    a single bucket and every search is exact.
+    """
+
+    def __init__(self, n_probe=8, train_threshold=2048, kmeans_iterations=10, seed=0):
+        self.n_probe = n_probe
+        self.train_threshold = train_threshold
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.dim = None
+        self.centroids = None
+        self.lists = []
+        self.positions = {}
+        self.trained_size = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, face_id):
+        return face_id in self.positions
+
+    @property
+    def n_lists(self):
+        return len(self.lists)
+
+    def add(self, face_id, embedding):
+        with self.lock:
+            self._insert(face_id, self._normalize(embedding))
+            self._maybe_train()
+
+    def add_many(self, face_ids, embeddings):
+        with self.lock:
+            for face_id, embedding in zip(face_ids, embeddings):
+                self._insert(face_id, self._normalize(embedding))
+            self._maybe_train()
+
+    def remove(self, face_id):
+        with self.lock:
+            if face_id not in self.positions:
+                return False
+            self._remove(face_id)
+            return True
+
+    def search(self, embedding, k=1, n_probe=None):
+        # Returns [(face_id, cosine_similarity), ...] sorted from most to least similar
+        query = self._normalize(embedding)
+        with self.lock:
+            if not self.positions:
+                return []
+
+            n_probe = min(n_probe or self.n_probe, self.n_lists)
+            if self.centroids is None or n_probe >= self.n_lists:
+                probe = range(self.n_lists)
+            else:
+                centroid_scores = self.centroids @ query
+                probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+            ids, scores = [], []
+            for list_id in probe:
+                inverted_list = self.lists[list_id]
+                if inverted_list.size:
+                    ids.append(inverted_list.ids[:inverted_list.size])
+                    scores.append(inverted_list.scores(query))
+
+        if not ids:
+            return []
+        ids = np.concatenate(ids)
+        scores = np.concatenate(scores)
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def train(self, n_lists=None):
+        # Spherical k-means over (a sample of) the stored vectors, then re-bucket everything
+        with self.lock:
+            face_ids, vectors = self._all_vectors()
+            if not len(face_ids):
+                return
+
+            n_lists = n_lists or max(1, int(np.sqrt(len(face_ids))))
+            rng = np.random.default_rng(self.seed)
+            sample = vectors
+            if len(vectors) > 64 * n_lists:
+                sample = vectors[rng.choice(len(vectors), 64 * n_lists, replace=False)]
+
+            centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+            for _ in range(self.kmeans_iterations):
+                assignments = np.argmax(sample @ centroids.T, axis=1)
+                for list_id in range(n_lists):
+                    members = sample[assignments == list_id]
+                    if len(members):
+                        centroids[list_id] = members.sum(axis=0)
+                centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+            self.centroids = centroids.astype(np.float32)
+            self.lists = [_InvertedList(self.dim) for _ in range(n_lists)]
+            self.positions = {}
+            for face_id, vector, list_id in zip(face_ids, vectors, self._assign(vectors)):
+                self.positions[int(face_id)] = (list_id, self.lists[list_id].append(face_id, vector))
+            self.trained_size = len(face_ids)
+
+    def _insert(self, face_id, vector):
+        if self.dim is None:
+            self.dim = vector.shape[0]
+            self.lists = [_InvertedList(self.dim)]
+        if face_id in self.positions:
+            self._remove(face_id)
+
+        list_id = self._assign(vector[None, :])[0]
+        self.positions[face_id] = (list_id, self.lists[list_id].append(face_id, vector))
+
+    def _maybe_train(self):
+        # (Re)train once the collection outgrew the partitioning it was built with
+        if len(self) >= self.train_threshold and len(self) >= 4 * self.trained_size:
+            self.train()
+
+    def _assign(self, vectors):
+        if self.centroids is None:
+            return np.zeros(len(vectors), dtype=np.int64)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _remove(self, face_id):
+        list_id, position = self.positions.pop(face_id)
+        moved_id = self.lists[list_id].remove(position)
+        if moved_id is not None:
+            self.positions[moved_id] = (list_id, position)
+
+    def _all_vectors(self):
+        lists = [inverted_list for inverted_list in self.lists if inverted_list.size]
+        if not lists:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+        face_ids = np.concatenate([inverted_list.ids[:inverted_list.size] for inverted_list in lists])
+        vectors = np.vstack([inverted_list.vectors() for inverted_list in lists])
+        return face_ids, vectors
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class FaceIndexRegistry:
+    """
+    One lazily built FaceIndex per key (e.g. faculty), shared by every request of the worker.
+
+    Indexes are kept current with catch_up(): rows added since the last call (by any worker) are loaded past a
+    per-key watermark, and an index older than max_age seconds is rebuilt from scratch so changes that leave no
+    new row behind (a student moving faculty, a template rewritten in place) reach every worker too.
+    """
+
+    def __init__(self, max_age=INDEX_MAX_AGE, **index_options):
+        self.max_age = max_age
+        self.index_options = index_options
+        self.indexes = {}
+        # Highest row already loaded and build time per key
+        self.watermarks = {}
+        self.built = {}
+        self.lock = threading.Lock()
+
+    def catch_up(self, key, loader):
+        # loader(after) -> (ids, embeddings, watermark) for the rows added after the watermark `after`
+        with self.lock:
+            index = self.indexes.get(key)
+            rebuild = index is None or time.monotonic() - self.built[key] >= self.max_age
+            if rebuild:
+                index = FaceIndex(**self.index_options)
+            after = 0 if rebuild else self.watermarks[key]
+            ids, embeddings, watermark = loader(after)
+            if ids:
+                index.add_many(ids, embeddings)
+            if rebuild:
+                self.built[key] = time.monotonic()
+            self.indexes[key] = index
+            self.watermarks[key] = max(after, watermark)
+        return index
+
+    def add(self, key, face_id, embedding):
+        # Incremental insert, skipped when the index was never loaded (it will include the row once built)
+        index = self.indexes.get(key)
+        if index is not None:
+            index.add(face_id, embedding)
+
+    def remove(self, face_id):
+        for index in list(self.indexes.values()):
+            index.remove(face_id)
+
+    def drop(self, key):
+        with self.lock:
+            self.indexes.pop(key, None)
+            self.watermarks.pop(key, None)
+            self.built.pop(key, None)
+
+
+# Student embeddings indexed per faculty for campus-wide identification
+faculty_indexes = FaceIndexRegistry()
+
+# Every enrolled student under a single key, searched at signup for faces that are already registered
+STUDENTS_INDEX_KEY = 'students'
+student_indexes = FaceIndexRegistry()
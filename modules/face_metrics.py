@@ -0,0 +1,178 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Finer buckets for single pipeline stages, some of which take well under a millisecond
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Adds a Server-Timing header with the per-stage breakdown to timed responses
+SERVER_TIMING = os.environ.get('FACECHECK_SERVER_TIMING', '0') == '1'
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    # Per-bucket (non-cumulative) counts plus count/sum, enough for averages and rough percentiles
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def snapshot(self):
+        with self.lock:
+            buckets = {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+            buckets['+Inf'] = self.counts[-1]
+            return {'count': self.count, 'sum': self.sum, 'mean': self.mean, 'buckets': buckets}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, name, factory):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(name, factory())
+        return metric
+
+    def counter(self, name):
+        return self._get_or_create(name, Counter)
+
+    def gauge(self, name):
+        return self._get_or_create(name, Gauge)
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(name, lambda: Histogram(buckets))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in sorted(self.metrics.items())}
+
+
+# Process-wide registry exposed through GET /api/face/metrics
+metrics = MetricsRegistry()
+
+_stage_context = threading.local()
+
+
+class StageTimings:
+    # Seconds spent per named stage while handling one request, in the order the stages first ran
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, stages):
+        for name, seconds in stages.items():
+            self.add(name, seconds)
+
+    def observe(self, prefix):
+        for name, seconds in self.stages.items():
+            metrics.histogram(f'{prefix}_{name}_seconds', STAGE_BUCKETS).observe(seconds)
+
+    def server_timing(self):
+        return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages.items())
+
+
+def current_timings():
+    # Timings of the request handled by this thread, None outside a timed request
+    return getattr(_stage_context, 'timings', None)
+
+
+@contextmanager
+def collect_stages():
+    # Starts a fresh StageTimings for this thread; the previous one is restored afterwards
+    previous = current_timings()
+    _stage_context.timings = StageTimings()
+    try:
+        yield _stage_context.timings
+    finally:
+        _stage_context.timings = previous
+
+
+@contextmanager
+def stage(name):
+    # Times the block into the current request's timings with a monotonic clock, no-op outside one
+    timings = current_timings()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def timed_stages(prefix):
+    """
+    Route decorator: every stage() run while handling the request is exported as a <prefix>_<stage>_seconds
+    histogram, plus <prefix>_total_seconds. With FACECHECK_SERVER_TIMING=1 the breakdown is also sent in a
+    Server-Timing header, readable from the browser or app network inspector.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with collect_stages() as timings:
+                result = view(*args, **kwargs)
+            timings.add('total', time.perf_counter() - started)
+            timings.observe(prefix)
+
+            response = result[0] if isinstance(result, tuple) else result
+            if SERVER_TIMING and hasattr(response, 'headers'):
+                response.headers['Server-Timing'] = timings.server_timing()
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,146 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+from modules.face_templates import TemplateMatrix
+
+# Shared file every worker maps read-only; empty disables the store and every reader falls back to PostgreSQL
+EMBEDDING_STORE_PATH = os.environ.get('FACECHECK_EMBEDDING_STORE', 'face_embeddings.store')
+# Seconds between checks for a rebuilt file, and the minimum spacing between rebuilds requested by signups
+STORE_CHECK_SECONDS = float(os.environ.get('FACECHECK_STORE_CHECK_SECONDS', 5))
+STORE_REBUILD_SECONDS = float(os.environ.get('FACECHECK_STORE_REBUILD_SECONDS', 30))
+
+# File layout: header (magic, format version, template size, rows, generation), then rows int64 ids sorted
+# ascending, then the rows x template_size packed template matrix (see modules/face_templates.py)
+STORE_HEADER = struct.Struct('<4sHxxIQQ')
+STORE_MAGIC = b'FCES'
+STORE_FORMAT_V1 = 1
+
+
+def write_store(path, ids, templates):
+    # Writes a new generation next to path and swaps it in with one atomic rename; readers that still map the
+    # previous file keep a valid mapping until they remap
+    ids = np.asarray(ids, dtype=np.int64)
+    order = np.argsort(ids, kind='stable')
+    templates = [bytes(templates[position]) for position in order]
+    template_size = len(templates[0]) if templates else 0
+
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(STORE_HEADER.pack(STORE_MAGIC, STORE_FORMAT_V1, template_size, len(templates), time.time_ns()))
+        file.write(ids[order].tobytes())
+        for template in templates:
+            file.write(template)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+class EmbeddingStore:
+    # One generation of the store file, mapped read-only so every worker shares the same page cache
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.inode = os.fstat(file.fileno()).st_ino
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, template_size, rows, self.generation = STORE_HEADER.unpack_from(self.map)
+        if magic != STORE_MAGIC or version != STORE_FORMAT_V1:
+            raise ValueError(f'{path} is not an embedding store file')
+
+        self.ids = np.frombuffer(self.map, dtype=np.int64, count=rows, offset=STORE_HEADER.size)
+        matrix_offset = STORE_HEADER.size + self.ids.nbytes
+        buffer = np.frombuffer(self.map, dtype=np.uint8, count=rows * template_size, offset=matrix_offset)
+        self.templates = TemplateMatrix.from_rows(buffer.reshape(rows, template_size) if rows else None)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def holds(self, model_name, version):
+        # Whether the templates were written for this model and encoding version; an empty generation holds nothing
+        # that could disagree
+        return not len(self.templates) or (self.templates.model_name, self.templates.version) == (model_name, version)
+
+    def lookup(self, ids):
+        # (positions, found): row of every id and whether this generation holds it at all
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.zeros(len(ids), dtype=np.intp), np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return positions, self.ids[positions] == ids
+
+
+class SharedEmbeddingStore:
+    """
+    Process-side handle on the store file: current() maps the latest generation (checking for a rebuilt file
+    at most every STORE_CHECK_SECONDS) and request_rebuild() regenerates it in the background, at most once per
+    STORE_REBUILD_SECONDS, under a file lock so only one worker writes at a time.
+    """
+
+    def __init__(self, path=EMBEDDING_STORE_PATH, check_seconds=STORE_CHECK_SECONDS, rebuild_seconds=STORE_REBUILD_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.store = None
+        self.checked = 0.0
+        self.rebuild_pending = False
+        self.lock = threading.Lock()
+
+    def current(self):
+        if not self.path:
+            return None
+        now = time.monotonic()
+        if now - self.checked >= self.check_seconds:
+            with self.lock:
+                if now - self.checked >= self.check_seconds:
+                    self.checked = now
+                    self.remap()
+        return self.store
+
+    def remap(self):
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            self.store = None
+            return
+        if self.store is None or self.store.inode != inode:
+            try:
+                self.store = EmbeddingStore(self.path)
+            except (OSError, ValueError, struct.error) as e:
+                print(f'Could not map embedding store: {e}')  # Error log
+                self.store = None
+
+    def rebuild(self, loader):
+        # loader() -> (ids, packed templates of one encoding)
+        with open(f'{self.path}.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            ids, templates = loader()
+            write_store(self.path, ids, templates)
+        with self.lock:
+            self.checked = 0.0
+
+    def request_rebuild(self, loader):
+        # Debounced: signups in a burst share one rebuild that runs rebuild_seconds after the first of them
+        if not self.path:
+            return
+        with self.lock:
+            if self.rebuild_pending:
+                return
+            self.rebuild_pending = True
+
+        def run():
+            time.sleep(self.rebuild_seconds)
+            with self.lock:
+                self.rebuild_pending = False
+            try:
+                self.rebuild(loader)
+            except Exception as e:
+                print(f'Embedding store rebuild failed: {e}')  # Error log
+
+        threading.Thread(target=run, name='embedding-store-rebuild', daemon=True).start()
+
+
+# Every enrolled student's template, read by class rosters instead of fetching templates from PostgreSQL
+student_store = SharedEmbeddingStore()
@@ -0,0 +1,133 @@
+import os
+import struct
+import numpy as np
+
+# Template layout: 8-byte header (version, model id, dimension, scale) followed by the vector body.
+# Every template version stores an L2-normalized embedding; the version also fixes the body encoding.
+TEMPLATE_HEADER = struct.Struct('<BBHf')
+TEMPLATE_INT8_V1 = 1
+TEMPLATE_FLOAT16_V1 = 2
+TEMPLATE_DTYPES = {TEMPLATE_INT8_V1: np.int8, TEMPLATE_FLOAT16_V1: np.float16}
+TEMPLATE_ENCODINGS = {'int8': TEMPLATE_INT8_V1, 'float16': TEMPLATE_FLOAT16_V1}
+
+# Encoding used for newly stored templates
+TEMPLATE_ENCODING = os.environ.get('FACECHECK_TEMPLATE_ENCODING', 'int8')
+
+# Stable ids, never reuse a number once templates have been stored with it
+MODEL_IDS = {
+    'VGG-Face': 1,
+    'Facenet': 2,
+    'Facenet512': 3,
+    'ArcFace': 4,
+    'SFace': 5,
+    'OpenFace': 6,
+    'DeepFace': 7,
+    'DeepID': 8,
+    'Dlib': 9,
+    'GhostFaceNet': 10,
+}
+MODEL_NAMES = {model_id: name for name, model_id in MODEL_IDS.items()}
+
+# Raw float32 blobs stored before templates had a header all came from VGG-Face, the only model used back then
+LEGACY_MODEL_NAME = 'VGG-Face'
+
+# Rows scored per chunk, bounds the float32 scratch space used while comparing packed templates
+SCORE_CHUNK_ROWS = 4096
+
+
+def normalize(embedding):
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def quantize(vector):
+    # Symmetric per-vector int8 quantization: vector ~= codes * scale
+    scale = float(np.max(np.abs(vector))) / 127.0 or 1.0
+    codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def pack_template(embedding, model_name, encoding=TEMPLATE_ENCODING):
+    vector = normalize(embedding)
+    version = TEMPLATE_ENCODINGS[encoding]
+    if version == TEMPLATE_INT8_V1:
+        body, scale = quantize(vector)
+    else:
+        body, scale = vector.astype(np.float16), 1.0
+    return TEMPLATE_HEADER.pack(version, MODEL_IDS[model_name], vector.shape[0], scale) + body.tobytes()
+
+
+def template_info(data):
+    # (version, model_name, dimension, scale) for a packed template, None for anything else
+    if len(data) < TEMPLATE_HEADER.size:
+        return None
+    version, model_id, dimension, scale = TEMPLATE_HEADER.unpack_from(data)
+    dtype = TEMPLATE_DTYPES.get(version)
+    if dtype is None or model_id not in MODEL_NAMES:
+        return None
+    if len(data) != TEMPLATE_HEADER.size + dimension * np.dtype(dtype).itemsize:
+        return None
+    return version, MODEL_NAMES[model_id], dimension, scale
+
+
+def unpack_template(data):
+    # Returns (normalized float32 vector, model_name); raw float32 blobs from before templates map to LEGACY_MODEL_NAME
+    data = bytes(data)
+    info = template_info(data)
+    if info is None:
+        return normalize(np.frombuffer(data, dtype=np.float32)), LEGACY_MODEL_NAME
+
+    version, model_name, dimension, scale = info
+    body = np.frombuffer(data, dtype=TEMPLATE_DTYPES[version], offset=TEMPLATE_HEADER.size, count=dimension)
+    return body.astype(np.float32) * np.float32(scale), model_name
+
+
+class TemplateMatrix:
+    """
+    Many templates of the same version and dimension kept in one contiguous (N, template_size) byte buffer.
+
+    scores() decodes and compares straight from that buffer through zero-copy views over the header and
+    body columns, so a roster only costs its packed size (about dimension + 8 bytes per identity for int8).
+    """
+
+    def __init__(self, templates):
+        templates = [bytes(template) for template in templates]
+        buffer = np.frombuffer(b''.join(templates), dtype=np.uint8).reshape(len(templates), -1) if templates else None
+        self.wrap(buffer)
+
+    @classmethod
+    def from_rows(cls, buffer):
+        # Wraps an existing (N, template_size) uint8 array, e.g. a memory-mapped one, without copying it
+        matrix = cls.__new__(cls)
+        matrix.wrap(buffer if buffer is not None and len(buffer) else None)
+        return matrix
+
+    def wrap(self, buffer):
+        self.buffer = buffer
+        self.rows = len(buffer) if buffer is not None else 0
+        if buffer is not None:
+            self.version, self.model_name, self.dimension, _ = template_info(bytes(buffer[0]))
+            body = self.buffer[:, TEMPLATE_HEADER.size:]
+            self.codes = body.view(TEMPLATE_DTYPES[self.version])
+            self.scales = self.buffer[:, 4:8].view(np.float32).ravel()
+
+    def take(self, positions):
+        # New matrix holding only the given rows (a copy, small next to the full matrix)
+        return TemplateMatrix.from_rows(self.buffer[positions] if self.buffer is not None else None)
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes if self.buffer is not None else 0
+
+    def scores(self, query):
+        # Cosine similarity of the query against every template
+        query = normalize(query)
+        scores = np.empty(self.rows, dtype=np.float32)
+        for start in range(0, self.rows, SCORE_CHUNK_ROWS):
+            stop = min(start + SCORE_CHUNK_ROWS, self.rows)
+            scores[start:stop] = self.codes[start:stop].astype(np.float32) @ query
+        return scores * self.scales
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+from flask import request
+
+# Largest binary frame accepted from a multipart or octet-stream upload
+MAX_UPLOAD_BYTES = int(os.environ.get('FACECHECK_MAX_UPLOAD_BYTES', 8 * 1024 * 1024))
+# Bytes copied from the request stream per read
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+def read_stream(stream, length):
+    # Copies the request stream chunk by chunk into one preallocated buffer, no intermediate bytes object
+    if length > MAX_UPLOAD_BYTES:
+        raise ValueError(f'Frames larger than {MAX_UPLOAD_BYTES} bytes are not accepted.')
+
+    buffer = np.empty(length, dtype=np.uint8)
+    filled = 0
+    while filled < length:
+        chunk = stream.read(min(UPLOAD_CHUNK_BYTES, length - filled))
+        if not chunk:
+            break
+        buffer[filled:filled + len(chunk)] = np.frombuffer(chunk, dtype=np.uint8)
+        filled += len(chunk)
+    return memoryview(buffer)[:filled]
+
+
+def read_face_request(frame_field, list_fields=()):
+    """
+    Body of a face request as a dict, whatever the upload format:
+
+    - application/json: frames are base64 strings, as sent by older app versions.
+    - multipart/form-data: frames are file parts named like the JSON fields, the rest are form fields.
+    - application/octet-stream: the body is the frame_field JPEG, the rest come from the query string.
+
+    Binary frames come back as bytes-like objects that ImageProcessor.decode_frame_reduced hands straight
+    to cv2.imdecode. Fields in list_fields are always lists (several parts with the same name).
+    """
+    if request.mimetype == 'application/octet-stream':
+        body = request.args.to_dict()
+        body[frame_field] = read_stream(request.stream, request.content_length or 0)
+        return body
+
+    if request.mimetype == 'multipart/form-data':
+        body = request.form.to_dict()
+        for name in request.files:
+            frames = []
+            for upload in request.files.getlist(name):
+                frame = upload.read(MAX_UPLOAD_BYTES + 1)
+                if len(frame) > MAX_UPLOAD_BYTES:
+                    raise ValueError(f'Frames larger than {MAX_UPLOAD_BYTES} bytes are not accepted.')
+                frames.append(frame)
+            body[name] = frames if name in list_fields else frames[0]
+        return body
+
+    return request.get_json(silent=True)
@@ -0,0 +1,275 @@
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from modules.facecheck import FaceQualityError, get_face_engine
+from modules.face_metrics import STAGE_BUCKETS, collect_stages, current_timings, metrics
+
+# Number of inference processes; 0 runs face work inline in the request thread (still bounded by the queue)
+FACE_WORKERS = int(os.environ.get('FACECHECK_FACE_WORKERS', 2))
+# Requests allowed to wait for a free inference process before new ones are rejected with 429
+FACE_QUEUE_SIZE = int(os.environ.get('FACECHECK_FACE_QUEUE_SIZE', 8))
+# Seconds a request waits for its result before giving up
+FACE_TIMEOUT = float(os.environ.get('FACECHECK_FACE_TIMEOUT', 30))
+# Concurrent verifications arriving within this window (ms) share one batched forward pass; 0 disables batching
+BATCH_WINDOW_MS = float(os.environ.get('FACECHECK_BATCH_WINDOW_MS', 15))
+MAX_BATCH_SIZE = int(os.environ.get('FACECHECK_MAX_BATCH_SIZE', 16))
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def count_quality_rejection(error):
+    # Every rejection is an embedding that never ran
+    metrics.counter(f'face_quality_rejected_{error.reason}_total').inc()
+
+
+class FaceQueueFullError(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Face verification is busy, please retry later.')
+        self.retry_after = retry_after
+
+
+class FaceTimeoutError(Exception):
+    # The inference process did not answer within FACE_TIMEOUT; its slot stays taken until it really finishes
+    def __init__(self, retry_after):
+        super().__init__('Face verification took too long, please retry later.')
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    # Runs once in every inference process: load the model there, never in the web worker
+    get_face_engine().warmup()
+
+
+def _call_engine(method_name, *args, **kwargs):
+    return getattr(get_face_engine(), method_name)(*args, **kwargs)
+
+
+def _timed_call_engine(method_name, args, kwargs):
+    # time.monotonic() is system-wide on Linux, so the start time is comparable with the submitting process.
+    # The engine's own stage timings travel back with the result.
+    started = time.monotonic()
+    with collect_stages() as stages:
+        result = _call_engine(method_name, *args, **kwargs)
+    return started, time.monotonic() - started, stages.stages, result
+
+
+class FaceWorkerPool:
+    def __init__(self, workers=FACE_WORKERS, queue_size=FACE_QUEUE_SIZE, timeout=FACE_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        self.warmup_futures = []
+        self.executor = None
+        if workers:
+            # spawn, not fork: TensorFlow state must never be inherited from the web worker
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+
+        self.queue_depth = metrics.gauge('face_pool_queue_depth')
+        self.service_time = metrics.histogram('face_pool_service_seconds')
+        self.wait_time = metrics.histogram('face_pool_wait_seconds')
+        self.rejected = metrics.counter('face_pool_rejected_total')
+        self.timed_out = metrics.counter('face_pool_timeouts_total')
+
+    def run(self, method_name, *args, **kwargs):
+        # Calls FaceCheck.<method_name> on an inference process, or raises FaceQueueFullError right away
+        if not self.slots.acquire(blocking=False):
+            self.rejected.inc()
+            raise FaceQueueFullError(self.retry_after())
+
+        self.queue_depth.inc()
+        submitted = time.monotonic()
+        try:
+            if self.executor is None:
+                try:
+                    started, service_time, stages, result = _timed_call_engine(method_name, args, kwargs)
+                finally:
+                    self.release_slot()
+            else:
+                try:
+                    future = self.executor.submit(_timed_call_engine, method_name, args, kwargs)
+                except Exception:
+                    self.release_slot()
+                    raise
+                # The slot is only freed once the task is over, so a request that timed out keeps counting against the bound
+                future.add_done_callback(self.release_slot)
+                try:
+                    started, service_time, stages, result = future.result(timeout=self.timeout)
+                except FutureTimeoutError:
+                    self.timed_out.inc()
+                    raise FaceTimeoutError(self.retry_after())
+            wait_time = max(started - submitted, 0.0)
+            self.wait_time.observe(wait_time)
+            self.service_time.observe(service_time)
+
+            timings = current_timings()
+            if timings is not None:
+                timings.add('pool_wait', wait_time)
+                timings.merge(stages)
+            return result
+        except FaceQualityError as qe:
+            count_quality_rejection(qe)
+            raise
+
+    def release_slot(self, future=None):
+        self.queue_depth.dec()
+        self.slots.release()
+
+    def retry_after(self):
+        # Seconds until the current backlog should have drained, at least one
+        backlog = self.queue_depth.snapshot() / max(self.workers, 1)
+        return max(1, math.ceil(backlog * self.service_time.mean))
+
+    def warmup(self):
+        # Start every inference process now so the model is loaded before the first request
+        if self.executor is None:
+            return get_face_engine().warmup()
+        self.warmup_futures = [self.executor.submit(_call_engine, 'status') for _ in range(self.workers)]
+        return True
+
+    def status(self):
+        if self.executor is None:
+            status = get_face_engine().status()
+        else:
+            ready = bool(self.warmup_futures) and all(
+                future.done() and not future.exception() and future.result()['ready'] for future in self.warmup_futures
+            )
+            status = self.warmup_futures[0].result() if ready else {'ready': False}
+        status.update({'workers': self.workers, 'queue_size': self.queue_size})
+        return status
+
+
+class MicroBatcher:
+    """
+    Gathers single items submitted by concurrent request threads and hands them to the pool as one call of a
+    batched engine method (one item list in, one result per item out), so 30 students checking in at once share
+    forward passes instead of each running a batch of one.
+
+    A batch closes window_ms after its first item or at max_batch items. Batches are dispatched from a small
+    thread pool so the next one keeps gathering while the previous one runs.
+
+    Only the dispatchers hold pool slots, so the batcher applies its own backpressure: at most max_pending items
+    may be waiting or running, by default a full batch per inference process plus FACE_QUEUE_SIZE waiting, like
+    the pool's own bound with a batch as the unit of work. Further items get FaceQueueFullError.
+    """
+
+    def __init__(self, name, method_name, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE, dispatchers=max(FACE_WORKERS, 1),
+                 max_pending=None):
+        self.method_name = method_name
+        self.window = window_ms / 1000.0
+        self.max_batch = max(max_batch, 1)
+        if max_pending is None:
+            max_pending = self.max_batch * max(FACE_WORKERS, 1) + FACE_QUEUE_SIZE
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pending = queue.Queue()
+        self.dispatcher = ThreadPoolExecutor(max_workers=dispatchers, thread_name_prefix=f'{name}-batch')
+        self.collector = None
+        self.lock = threading.Lock()
+
+        self.batch_size = metrics.histogram(f'{name}_batch_size', BATCH_SIZE_BUCKETS)
+        self.queue_wait = metrics.histogram(f'{name}_batch_queue_wait_seconds', STAGE_BUCKETS)
+
+    def submit(self, item):
+        # Blocks until the batch containing item has run; raises whatever the pool or the item itself raised
+        if self.window <= 0:
+            result = get_face_pool().run(self.method_name, [item])[0]
+        else:
+            pool = get_face_pool()
+            if not self.slots.acquire(blocking=False):
+                pool.rejected.inc()
+                raise FaceQueueFullError(pool.retry_after())
+
+            self.start()
+            future = Future()
+            # Released once the batch answered, not when a waiting request gives up
+            future.add_done_callback(lambda _: self.slots.release())
+            self.pending.put((time.monotonic(), item, future))
+            try:
+                result, stages = future.result(timeout=self.window + pool.timeout)
+            except FutureTimeoutError:
+                pool.timed_out.inc()
+                raise FaceTimeoutError(pool.retry_after())
+            # The batch's engine stages count towards every request that was part of it
+            timings = current_timings()
+            if timings is not None:
+                timings.merge(stages)
+
+        if isinstance(result, FaceQualityError):
+            count_quality_rejection(result)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def start(self):
+        if self.collector is None:
+            with self.lock:
+                if self.collector is None:
+                    self.collector = threading.Thread(target=self.collect, name='face-batch-collector', daemon=True)
+                    self.collector.start()
+
+    def collect(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = batch[0][0] + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.dispatcher.submit(self.dispatch, batch)
+
+    def dispatch(self, batch):
+        dispatched = time.monotonic()
+        for submitted, _, _ in batch:
+            self.queue_wait.observe(dispatched - submitted)
+        self.batch_size.observe(len(batch))
+
+        try:
+            with collect_stages() as timings:
+                results = get_face_pool().run(self.method_name, [item for _, item, _ in batch])
+        except Exception as e:
+            # Pool errors (queue full, timeout) fail every request of the batch
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (submitted, _, future), result in zip(batch, results):
+            stages = dict(timings.stages, batch_wait=dispatched - submitted)
+            future.set_result((result, stages))
+
+
+_face_pool = None
+_face_pool_lock = threading.Lock()
+
+
+def get_face_pool():
+    global _face_pool
+    if _face_pool is None:
+        with _face_pool_lock:
+            if _face_pool is None:
+                _face_pool = FaceWorkerPool()
+    return _face_pool
+
+
+_verify_batcher = None
+_verify_batcher_lock = threading.Lock()
+
+
+def get_verify_batcher():
+    # Micro-batches FaceCheck.check_matches for /face/verify requests against stored embeddings
+    global _verify_batcher
+    if _verify_batcher is None:
+        with _verify_batcher_lock:
+            if _verify_batcher is None:
+                _verify_batcher = MicroBatcher('face_verify', 'check_matches')
+    return _verify_batcher
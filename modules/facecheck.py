@@ -1,56 +1,610 @@
-from deepface import DeepFace
+from collections import namedtuple
 import numpy as np
 import cv2
 import base64
+import binascii
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from modules.face_detectors import get_detector
+from modules.face_embedders import get_embedder
+from modules.face_metrics import metrics, stage
+from modules.face_cache import TTLCache
+from modules.face_templates import (TEMPLATE_ENCODING, TEMPLATE_ENCODINGS, TemplateMatrix, pack_template,
+                                    template_info, unpack_template)
+
+# Recognition model used both at signup (reference embedding) and at verification time. Templates stored with
+# another model are recomputed from the face image, so changing it only costs a slower first verification.
+MODEL_NAME = os.environ.get('FACECHECK_MODEL', 'VGG-Face')
+
+# Smallest side, in pixels, a captured frame needs for the detector; larger JPEGs are decoded at 1/2, 1/4 or 1/8
+DETECTOR_MIN_SIDE = 480
+
+# Side of the aligned face crop handed to the model, and the margin kept around the detected box
+FACE_CROP_SIZE = 160
+FACE_CROP_MARGIN = 0.2
+
+# Cosine distance thresholds as calibrated by DeepFace for each model
+MODEL_THRESHOLDS = {
+    'VGG-Face': 0.68,
+    'Facenet': 0.40,
+    'Facenet512': 0.30,
+    'ArcFace': 0.68,
+    'SFace': 0.593,
+    'OpenFace': 0.10,
+    'DeepFace': 0.23,
+    'DeepID': 0.015,
+    'Dlib': 0.07,
+    'GhostFaceNet': 0.65,
+}
+# Thresholds recalibrated on our own captures, e.g. '{"SFace": 0.55}', take precedence over DeepFace's
+MODEL_THRESHOLDS.update(json.loads(os.environ.get('FACECHECK_MODEL_THRESHOLDS', '{}')))
+
+# Verification cascade: FAST_MODEL_NAME decides clear cases on its own and MODEL_NAME only runs when the fast
+# distance lies within CASCADE_BAND (relative to the fast model's threshold) of the threshold. Empty disables it.
+FAST_MODEL_NAME = os.environ.get('FACECHECK_FAST_MODEL', 'SFace')
+CASCADE_BAND = float(os.environ.get('FACECHECK_CASCADE_BAND', 0.15))
+
+# Burst verification stops at the first frame whose distance is at least this far under the threshold,
+# or once the time budget is spent; otherwise the closest frame decides
+BURST_MATCH_MARGIN = 0.05
+BURST_BUDGET_SECONDS = 2.0
+
+# Base64 frames are decoded this many characters at a time (a multiple of 4) into a buffer reused by each thread;
+# frames larger than DECODE_BUFFER_MAX_BYTES decode into a one-off buffer so threads never pin more than that
+BASE64_CHUNK_CHARS = 64 * 1024
+DECODE_BUFFER_MAX_BYTES = int(os.environ.get('FACECHECK_DECODE_BUFFER_BYTES', 4 * 1024 * 1024))
+
+# Side of the grayscale copy used for the sharpness score and the quality gate
+SHARPNESS_SIDE = 160
+
+# Quality gate for captured frames, checked before detection (brightness, sharpness) and before embedding (face size)
+QUALITY_MIN_BRIGHTNESS = 40
+QUALITY_MAX_BRIGHTNESS = 225
+QUALITY_MIN_SHARPNESS = 25.0
+# Smallest face side as a fraction of the frame's short side
+QUALITY_MIN_FACE_RATIO = 0.15
+QUALITY_REASONS = {
+    'too_dark': 'Image is too dark.',
+    'too_bright': 'Image is overexposed.',
+    'blurry': 'Image is too blurry.',
+    'face_too_small': 'Face is too small, move closer to the camera.',
+}
+
+# Output of the single detection + alignment pass: the normalized crop and the box it came from
+FaceCrop = namedtuple('FaceCrop', ['image', 'box', 'aligned'])
+
+
+class FaceQualityError(ValueError):
+    # Captured frame rejected by the quality gate; reason is one of QUALITY_REASONS
+    def __init__(self, reason):
+        super().__init__(QUALITY_REASONS[reason])
+        self.reason = reason
+
+    def __reduce__(self):
+        # Raised inside inference processes, so it must survive pickling with its reason
+        return FaceQualityError, (self.reason,)
+
 
 class FaceCheck:
     def __init__(self):
-        self.face_match = False
+        # Loaded once per process, shared by every request through get_face_engine()
+        self.detector = get_detector()
+        self.ready = False
+        self.warmup_seconds = None
+        # Fast-model embeddings of stored references, keyed by the reference face hash
+        self.fast_references = TTLCache('face_fast_reference', maxsize=4096, ttl=3600)
+
+    def warmup(self):
+        # Build the recognition model and detector and run one inference so no request pays for it
+        start = time.perf_counter()
+        synthetic_face = self.synthetic_face_image()
+        self.detect_face(synthetic_face)
+        self.embed_faces([synthetic_face])
+        if FAST_MODEL_NAME:
+            self.embed_faces([synthetic_face], FAST_MODEL_NAME)
+        self.warmup_seconds = time.perf_counter() - start
+        self.ready = True
+        print(f"Face engine ready ({MODEL_NAME}/{get_embedder(MODEL_NAME).name}/{self.detector.name}) in {self.warmup_seconds:.2f}s")
+        return self.ready
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'model_name': MODEL_NAME,
+            'fast_model_name': FAST_MODEL_NAME or None,
+            'embedding_backend': get_embedder(MODEL_NAME).name if self.ready else None,
+            'detector_backend': self.detector.name,
+            'warmup_seconds': self.warmup_seconds
+        }
+
+    # The check_match* methods return (match, tier): tier is 'fast' or 'accurate', the cascade tier that decided,
+    # and match is 'VALUE ERROR' (with tier None) when a face is missing
 
     def check_match(self, cap_frame, ref_frame):
-        try:
-            if DeepFace.verify(cap_frame, ref_frame)['verified']:
-                self.face_match = True
+        cap_crop = self.detect_captured_face(cap_frame)
+        ref_crop = self.detect_face(ref_frame)
+        if cap_crop is None or ref_crop is None:
+            return 'VALUE ERROR', None
+
+        crops = [cap_crop.image, ref_crop.image]
+        if FAST_MODEL_NAME:
+            match = self.fast_decision(*self.embed_faces(crops, FAST_MODEL_NAME))
+            if match is not None:
+                return match, 'fast'
+
+        cap_embedding, ref_embedding = self.embed_faces(crops)
+        return self.embeddings_match(cap_embedding, ref_embedding), 'accurate'
+
+    def check_matches(self, items):
+        """
+        Verification against stored embeddings, batched: items are (cap, ref_embedding, ref_key, ref_frame_base64)
+        where cap is a captured frame or a FaceCrop (possibly from an earlier check-existing call). Every crop goes
+        through one forward pass per model.
+
+        With the stored reference image the fast model gets the first say; the stored embedding belongs to
+        MODEL_NAME. Returns one (match, tier) per item, or the exception that item raised (e.g. FaceQualityError)
+        so one bad frame does not fail the rest of the batch.
+        """
+        results = [None] * len(items)
+        crops = {}
+        for position, (cap, _, _, _) in enumerate(items):
+            try:
+                crop = cap if isinstance(cap, FaceCrop) else self.detect_captured_face(cap)
+            except ValueError as e:
+                results[position] = e
+                continue
+            if crop is None:
+                results[position] = ('VALUE ERROR', None)
             else:
-                self.face_match = False
-        except ValueError:
-            self.face_match = 'VALUE ERROR'
+                crops[position] = crop
 
-        return self.face_match
+        if FAST_MODEL_NAME:
+            fast_references = {}
+            for position in crops:
+                _, _, ref_key, ref_frame_base64 = items[position]
+                if ref_key and ref_frame_base64:
+                    try:
+                        fast_references[position] = self.fast_reference(ref_key, ref_frame_base64)
+                    except ValueError:
+                        # Unreadable stored image, the accurate model still has the stored embedding
+                        fast_references[position] = None
+            fast_positions = [position for position, reference in fast_references.items() if reference is not None]
+            fast_embeddings = self.embed_faces([crops[position].image for position in fast_positions], FAST_MODEL_NAME)
+            for position, embedding in zip(fast_positions, fast_embeddings):
+                try:
+                    match = self.fast_decision(embedding, fast_references[position])
+                except ValueError:
+                    # Leave the decision to the accurate model
+                    continue
+                if match is not None:
+                    results[position] = (match, 'fast')
+
+        accurate_positions = [position for position in crops if results[position] is None]
+        accurate_embeddings = self.embed_faces([crops[position].image for position in accurate_positions])
+        for position, embedding in zip(accurate_positions, accurate_embeddings):
+            try:
+                results[position] = (self.embeddings_match(embedding, items[position][1]), 'accurate')
+            except ValueError as e:
+                # A stored embedding of another dimension only fails its own item
+                results[position] = e
+        return results
+
+    def fast_reference(self, ref_key, ref_frame_base64):
+        # Fast-model embedding of a stored reference image, None when it has no detectable face
+        embedding = self.fast_references.get(ref_key)
+        if embedding is None:
+            ref_crop = self.detect_face(ImageProcessor.decode_frame_reduced(ref_frame_base64)[0])
+            if ref_crop is None:
+                return None
+            embedding = self.embed_faces([ref_crop.image], FAST_MODEL_NAME)[0]
+            self.fast_references.set(ref_key, embedding)
+        return embedding
 
     @staticmethod
-    def face_exists(image):
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    def fast_decision(cap_embedding, ref_embedding):
+        # Match according to the fast model, None when the distance falls in the ambiguous band
+        threshold = MODEL_THRESHOLDS[FAST_MODEL_NAME]
+        distance = FaceCheck.cosine_distance(cap_embedding, ref_embedding)
+        if abs(distance - threshold) <= CASCADE_BAND * threshold:
+            return None
+        return bool(distance <= threshold)
+
+    def check_match_burst(self, cap_frames, ref_embedding=None, ref_frame=None, budget_seconds=BURST_BUDGET_SECONDS):
+        # Several frames of the same check-in, tried sharpest first and embedded one at a time.
+        # Returns (match, frames_used); match is 'VALUE ERROR' when no frame (or the reference) has a face.
+        started = time.monotonic()
+        if ref_embedding is None:
+            ref_crop = self.detect_face(ref_frame)
+            if ref_crop is None:
+                return 'VALUE ERROR', 0
+            ref_embedding = self.embed_faces([ref_crop.image])[0]
+
+        threshold = MODEL_THRESHOLDS[MODEL_NAME]
+        best_distance = None
+        rejected = None
+        frames_used = 0
+        for frame in sorted(cap_frames, key=ImageProcessor.sharpness, reverse=True):
+            frames_used += 1
+            try:
+                crop = self.detect_captured_face(frame)
+            except FaceQualityError as qe:
+                # Skip unusable frames, the next one may be fine
+                crop, rejected = None, rejected or qe
+            if crop is not None:
+                distance = self.cosine_distance(self.embed_faces([crop.image])[0], ref_embedding)
+                if distance <= threshold - BURST_MATCH_MARGIN:
+                    return True, frames_used
+                best_distance = distance if best_distance is None else min(best_distance, distance)
+            if time.monotonic() - started >= budget_seconds:
+                break
+
+        if best_distance is None:
+            if rejected is not None:
+                raise rejected
+            return 'VALUE ERROR', frames_used
+        return bool(best_distance <= threshold), frames_used
+
+    def compute_embedding(self, image):
+        # Raises ValueError when no face can be detected in the captured image
+        crop = self.detect_captured_face(image)
+        if crop is None:
+            raise ValueError('Face could not be detected in the image.')
+        return self.embed_faces([crop.image])[0]
+
+    def prepare_reference(self, image):
+        # Canonical crop to store as the reference image plus its embedding, (None, None) without a face
+        crop = self.detect_face(image)
+        if crop is None:
+            return None, None
+        return crop.image, self.embed_faces([crop.image])[0]
+
+    def compute_embeddings(self, images):
+        # Detect and align each image once, then embed every crop in one batched forward pass.
+        # Images without a detectable face come back as None.
+        crops = [self.detect_face(image) for image in images]
+        found = [crop.image for crop in crops if crop is not None]
+        embeddings = iter(self.embed_faces(found))
+        return [next(embeddings) if crop is not None else None for crop in crops]
+
+    def detect_face(self, image):
+        # The single detection + alignment pass of the pipeline, None when no face is found
+        with stage('detect'):
+            faces = self.detector.detect(image)
+        if not faces:
+            return None
+
+        # Largest face is the one in front of the camera
+        box, eyes = faces[0]
+        with stage('align'):
+            crop = ImageProcessor.normalize_face(image, box, eyes)
+        return FaceCrop(crop, box, eyes is not None)
+
+    def detect_captured_face(self, image):
+        # detect_face behind the quality gate, raises FaceQualityError so no model runs on an unusable frame
+        self.check_quality(image)
+        crop = self.detect_face(image)
+        if crop is not None and min(crop.box[2:]) < QUALITY_MIN_FACE_RATIO * min(image.shape[:2]):
+            raise FaceQualityError('face_too_small')
+        return crop
+
+    @staticmethod
+    def check_quality(image):
+        # A few milliseconds on a small grayscale copy, before the detector runs
+        with stage('quality'):
+            gray = ImageProcessor.small_gray(image)
+            brightness = float(gray.mean())
+            sharpness = ImageProcessor.laplacian_variance(gray)
+        if brightness < QUALITY_MIN_BRIGHTNESS:
+            raise FaceQualityError('too_dark')
+        if brightness > QUALITY_MAX_BRIGHTNESS:
+            raise FaceQualityError('too_bright')
+        if sharpness < QUALITY_MIN_SHARPNESS:
+            raise FaceQualityError('blurry')
+
+    @staticmethod
+    def embed_faces(crops, model_name=MODEL_NAME):
+        # Backend per model from modules/face_embedders.py, built on first use
+        if not crops:
+            return []
+        embedder = get_embedder(model_name)
+        with stage('embed' if model_name == MODEL_NAME else 'embed_fast'):
+            return embedder.embed(crops)
+
+    @staticmethod
+    def match_result(face_id, score):
+        # Shapes a 1:N search hit (cosine similarity) into the response used by the identification routes
+        distance = 1.0 - score
+        return {
+            'id': face_id,
+            'score': score,
+            'distance': distance,
+            'match': distance <= MODEL_THRESHOLDS[MODEL_NAME]
+        }
+
+    @staticmethod
+    def embeddings_match(embedding_a, embedding_b):
+        return bool(FaceCheck.cosine_distance(embedding_a, embedding_b) <= MODEL_THRESHOLDS[MODEL_NAME])
+
+    @staticmethod
+    def cosine_distance(embedding_a, embedding_b):
+        with stage('distance'):
+            a = np.asarray(embedding_a, dtype=np.float32)
+            b = np.asarray(embedding_b, dtype=np.float32)
+            return 1.0 - float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+    @staticmethod
+    def serialize_embedding(embedding):
+        # Compact template (see modules/face_templates.py) stored in faces_students / faces_teachers
+        if embedding is None:
+            return None
+        return pack_template(embedding, MODEL_NAME)
+
+    @staticmethod
+    def deserialize_embedding(data):
+        # None when nothing is stored or the template belongs to another model and must be recomputed
+        if data is None:
+            return None
+        embedding, model_name = unpack_template(data)
+        if model_name != MODEL_NAME:
+            return None
+        return embedding
+
+    @staticmethod
+    def repack_template(data):
+        # Stored template in the current encoding, so rosters can hold uniform packed rows
+        embedding = FaceCheck.deserialize_embedding(data)
+        if embedding is None:
+            return None
+        data = bytes(data)
+        info = template_info(data)
+        if info and info[0] == TEMPLATE_ENCODINGS[TEMPLATE_ENCODING]:
+            return data
+        return FaceCheck.serialize_embedding(embedding)
+
+    @staticmethod
+    def synthetic_face_image(size=224):
+        # Crude frontal face drawing, enough to push the warmup through the detector and the model
+        image = np.full((size, size, 3), 200, dtype=np.uint8)
+        center = (size // 2, size // 2)
+        cv2.ellipse(image, center, (size // 3, int(size / 2.4)), 0, 0, 360, (150, 170, 210), -1)
+        for dx in (-size // 7, size // 7):
+            cv2.circle(image, (center[0] + dx, center[1] - size // 10), size // 20, (40, 40, 40), -1)
+        cv2.ellipse(image, (center[0], center[1] + size // 6), (size // 8, size // 24), 0, 0, 180, (60, 60, 120), -1)
+        return image
+
+
+class FaceRoster:
+    # Enrolled identities kept as one packed template matrix, one row per identity
+    def __init__(self, ids, templates):
+        rows = [(face_id, FaceCheck.repack_template(template)) for face_id, template in zip(ids, templates)]
+        rows = [(face_id, template) for face_id, template in rows if template is not None]
+        self.ids = [face_id for face_id, _ in rows]
+        self.templates = TemplateMatrix([template for _, template in rows])
+
+    @classmethod
+    def from_matrix(cls, ids, templates):
+        # Roster over an already packed TemplateMatrix, e.g. rows taken from the shared embedding store
+        roster = cls.__new__(cls)
+        roster.ids = list(ids)
+        roster.templates = templates
+        return roster
+
+    def __len__(self):
+        return len(self.ids)
+
+    def best_match(self, embedding):
+        if not self.ids:
+            return None
+
+        similarities = self.templates.scores(embedding)
+        best = int(np.argmax(similarities))
+        return FaceCheck.match_result(self.ids[best], float(similarities[best]))
+
+
+_face_engine = None
+_face_engine_lock = threading.Lock()
+
+# Shared by ImageProcessor.decode_base64_many
+_decode_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='image-decode')
+
+# Per-thread base64 decode buffer, see ImageProcessor.decode_base64_buffer
+_decode_buffers = threading.local()
+decode_buffer_allocations = metrics.counter('face_decode_buffer_allocations_total')
+decode_buffer_reuses = metrics.counter('face_decode_buffer_reuses_total')
+
+
+def get_face_engine():
+    # Process-wide FaceCheck instance so the model and detector are only loaded once per worker
+    global _face_engine
+    if _face_engine is None:
+        with _face_engine_lock:
+            if _face_engine is None:
+                _face_engine = FaceCheck()
+    return _face_engine
 
-        if len(faces) > 0:
-            for (x, y, w, h) in faces:
-                print(f"Face detected with characteristics: x={x}, y={y}, width={w}, height={h}")
-            return True
-        return False
 
 class ImageProcessor:
+    # JPEG start-of-frame markers, the segment that carries the image dimensions
+    JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+    REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
     @staticmethod
     def decode_base64(image_base64):
         try:
-            img_data = base64.b64decode(image_base64)
-            np_img = np.frombuffer(img_data, np.uint8)
+            np_img = np.frombuffer(ImageProcessor.decode_base64_buffer(image_base64), np.uint8)
             img = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
             return img
         except Exception as e:
             raise ValueError(f"Invalid Base64 input: {str(e)}")
 
+    @staticmethod
+    def decode_base64_buffer(image_base64):
+        # Decodes a base64 str or bytes into this thread's reusable buffer, BASE64_CHUNK_CHARS at a time, so neither
+        # an ASCII copy of the payload nor a payload-sized bytes object is created. The returned memoryview is only
+        # valid until the same thread decodes its next frame.
+        buffer = ImageProcessor.decode_buffer(len(image_base64) * 3 // 4 + 3)
+        filled = 0
+        try:
+            for start in range(0, len(image_base64), BASE64_CHUNK_CHARS):
+                chunk = binascii.a2b_base64(image_base64[start:start + BASE64_CHUNK_CHARS])
+                buffer[filled:filled + len(chunk)] = chunk
+                filled += len(chunk)
+        except ValueError:
+            # Characters outside the alphabet (line breaks, a data: prefix) can misalign the chunks; the whole-payload
+            # decode handles them like before and raises for input that is really invalid
+            return memoryview(base64.b64decode(image_base64))
+        return memoryview(buffer)[:filled]
+
+    @staticmethod
+    def decode_buffer(size):
+        # Never resized in place: a view handed out earlier may still be alive, so growing means a new bytearray
+        buffer = getattr(_decode_buffers, 'buffer', None)
+        if buffer is not None and len(buffer) >= size:
+            decode_buffer_reuses.inc()
+            return buffer
+
+        decode_buffer_allocations.inc()
+        if size > DECODE_BUFFER_MAX_BYTES:
+            return bytearray(size)
+        # Next power of two, so a thread seeing slowly growing frames does not reallocate for each of them
+        _decode_buffers.buffer = bytearray(min(1 << (size - 1).bit_length(), DECODE_BUFFER_MAX_BYTES))
+        return _decode_buffers.buffer
+
+    @staticmethod
+    def decode_base64_reduced(image_base64, min_side=DETECTOR_MIN_SIDE):
+        # Lets libjpeg decode straight at 1/2, 1/4 or 1/8 scale while keeping the short side >= min_side.
+        # Returns (image, scale) where scale maps decoded pixels back to the original (1.0 when not reduced).
+        try:
+            with stage('base64_decode'):
+                img_data = ImageProcessor.decode_base64_buffer(image_base64)
+        except Exception as e:
+            raise ValueError(f"Invalid Base64 input: {str(e)}")
+        return ImageProcessor.decode_bytes_reduced(img_data, min_side)
+
+    @staticmethod
+    def decode_bytes_reduced(img_data, min_side=DETECTOR_MIN_SIDE):
+        # Same as decode_base64_reduced for an already binary JPEG/PNG (bytes, bytearray, memoryview)
+        img_data = memoryview(img_data)
+        if not img_data.nbytes:
+            # Payloads such as '====' or ' ' decode to nothing, cv2.imdecode raises on an empty buffer
+            raise ValueError("Invalid image data")
+        flags, scale = cv2.IMREAD_COLOR, 1.0
+        dimensions = ImageProcessor.jpeg_dimensions(img_data)
+        if dimensions:
+            short_side = min(dimensions)
+            for factor, reduced_flags in ImageProcessor.REDUCED_DECODE_FLAGS:
+                if short_side // factor >= min_side:
+                    flags, scale = reduced_flags, 1.0 / factor
+                    break
+
+        with stage('imdecode'):
+            try:
+                img = cv2.imdecode(np.frombuffer(img_data, np.uint8), flags)
+            except cv2.error:
+                img = None
+        if img is None:
+            raise ValueError("Invalid image data")
+        return img, scale
+
+    @staticmethod
+    def decode_frame_reduced(frame, min_side=DETECTOR_MIN_SIDE):
+        # Frame as sent by the app: a base64 string from JSON or raw bytes from a binary upload
+        if isinstance(frame, str):
+            return ImageProcessor.decode_base64_reduced(frame, min_side)
+        return ImageProcessor.decode_bytes_reduced(frame, min_side)
+
+    @staticmethod
+    def jpeg_dimensions(data):
+        # Reads (width, height) from the JPEG header without decoding, None if data is not a JPEG
+        if data[:2] != b'\xff\xd8':
+            return None
+
+        position = 2
+        while position + 9 < len(data):
+            if data[position] != 0xFF:
+                return None
+            marker = data[position + 1]
+            if marker == 0xFF:
+                # Fill byte
+                position += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                # Standalone markers carry no length
+                position += 2
+                continue
+
+            segment_length = int.from_bytes(data[position + 2:position + 4], 'big')
+            if marker in ImageProcessor.JPEG_SOF_MARKERS:
+                height = int.from_bytes(data[position + 5:position + 7], 'big')
+                width = int.from_bytes(data[position + 7:position + 9], 'big')
+                return width, height
+            position += 2 + segment_length
+
+        return None
+
+    @staticmethod
+    def normalize_face(image, box, eyes=None, size=FACE_CROP_SIZE, margin=FACE_CROP_MARGIN):
+        # Canonical size x size face crop: one affine warp that levels the eyes (when known) and crops a square
+        # with a margin around the box. The same scale is used on both axes, so the face is never stretched.
+        x, y, w, h = box
+        centre = (x + w / 2, y + h / 2)
+        side = max(w, h) * (1 + 2 * margin)
+        angle = 0.0
+        if eyes is not None:
+            (left_x, left_y), (right_x, right_y) = eyes
+            angle = float(np.degrees(np.arctan2(right_y - left_y, right_x - left_x)))
+
+        matrix = cv2.getRotationMatrix2D(centre, angle, size / side)
+        matrix[0, 2] += size / 2 - centre[0]
+        matrix[1, 2] += size / 2 - centre[1]
+        return cv2.warpAffine(image, matrix, (size, size), flags=cv2.INTER_AREA, borderMode=cv2.BORDER_REPLICATE)
+
+    @staticmethod
+    def small_gray(image, side=SHARPNESS_SIDE):
+        # Grayscale copy with the short side downscaled to side pixels
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        factor = side / min(height, width)
+        if factor < 1:
+            gray = cv2.resize(gray, (max(1, round(width * factor)), max(1, round(height * factor))), interpolation=cv2.INTER_AREA)
+        return gray
+
+    @staticmethod
+    def laplacian_variance(gray):
+        # Motion blur and defocus drive it towards zero
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    @staticmethod
+    def sharpness(image, side=SHARPNESS_SIDE):
+        return ImageProcessor.laplacian_variance(ImageProcessor.small_gray(image, side))
+
+    @staticmethod
+    def decode_base64_many(images_base64):
+        # cv2.imdecode releases the GIL, so a batch of frames decodes in parallel; failed entries come back as None
+        def decode(image_base64):
+            try:
+                return ImageProcessor.decode_frame_reduced(image_base64)[0]
+            except ValueError:
+                return None
+
+        return list(_decode_executor.map(decode, images_base64))
+
     @staticmethod
     def resize_image(image, max_height=320):
+        # Downscale to max_height keeping the aspect ratio; smaller images are left as they are
         height, width = image.shape[:2]
-        new_height = max_height
-        new_width = int((9 / 16) * max_height)
-        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        if height <= max_height:
+            return image
+        new_width = max(1, round(width * max_height / height))
+        image = cv2.resize(image, (new_width, max_height), interpolation=cv2.INTER_AREA)
         return image
 
     @staticmethod
     def encode_binary(image):
+        # Aspect-preserving downscale; signup passes the already normalized face crop
         resized_image = ImageProcessor.resize_image(image)
         _, buffer = cv2.imencode('.jpg', resized_image, [int(cv2.IMWRITE_JPEG_QUALITY), 90])  # Calidad ajustada a 90
         return buffer.tobytes()
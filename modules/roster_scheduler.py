@@ -0,0 +1,172 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta, time as dt_time
+from modules.face_cache import ROSTER_CACHE_TTL, class_rosters
+from modules.database_modules.class_database import ClassesDatabase
+from modules.database_modules.face_database import FaceDatabase
+
+# Rosters are loaded this many minutes before a session starts and dropped this many minutes after it ends
+ROSTER_PREWARM_MINUTES = float(os.environ.get('FACECHECK_ROSTER_PREWARM_MINUTES', 10))
+ROSTER_GRACE_MINUTES = float(os.environ.get('FACECHECK_ROSTER_GRACE_MINUTES', 15))
+# Seconds between two passes over the class schedules
+ROSTER_SCHEDULER_INTERVAL = float(os.environ.get('FACECHECK_ROSTER_SCHEDULER_INTERVAL', 60))
+
+# week_days is free text: Spanish or English names, their two and three-letter abbreviations, one-letter codes
+# (L M X J V S D) or ISO weekday numbers (1 = Monday) are all understood. Keys are accent-free and lowercase.
+WEEKDAY_NAMES = {
+    'lunes': 0, 'lun': 0, 'lu': 0, 'monday': 0, 'mon': 0, 'mo': 0,
+    'martes': 1, 'mar': 1, 'ma': 1, 'tuesday': 1, 'tue': 1, 'tu': 1,
+    'miercoles': 2, 'mie': 2, 'mi': 2, 'wednesday': 2, 'wed': 2, 'we': 2,
+    'jueves': 3, 'jue': 3, 'ju': 3, 'thursday': 3, 'thu': 3, 'th': 3,
+    'viernes': 4, 'vie': 4, 'vi': 4, 'friday': 4, 'fri': 4, 'fr': 4,
+    'sabado': 5, 'sab': 5, 'sa': 5, 'saturday': 5, 'sat': 5,
+    'domingo': 6, 'dom': 6, 'do': 6, 'sunday': 6, 'sun': 6, 'su': 6,
+}
+# Connectives between day names, as in 'Lunes y Miercoles'
+WEEKDAY_CONNECTIVES = {'y', 'e', 'and'}
+# 'M' is both martes and miercoles, so it is resolved from the rest of the code in parse_day_code
+WEEKDAY_LETTERS = {'l': 0, 'x': 2, 'w': 2, 'j': 3, 'v': 4, 's': 5, 'd': 6}
+
+
+def parse_day_code(code, wednesday_lettered):
+    # Weekday numbers of a compact code such as 'LXV', 'MJ' or 'LMMJV', None when it cannot be read unambiguously.
+    # A single 'M' is martes only when the schedule writes miercoles as 'X'/'W'; in 'MM' the first is martes and
+    # the second miercoles, as in the usual week order.
+    if not code or not all(letter == 'm' or letter in WEEKDAY_LETTERS for letter in code):
+        return None
+    m_count = code.count('m')
+    if m_count == 0:
+        m_days = set()
+    elif m_count == 1 and wednesday_lettered:
+        m_days = {1}
+    elif m_count == 2:
+        m_days = {1, 2}
+    else:
+        return None
+    return {WEEKDAY_LETTERS[letter] for letter in code if letter != 'm'} | m_days
+
+
+def parse_week_days(week_days):
+    # Set of weekday numbers (0 = Monday); raises ValueError naming the parts that are not a weekday
+    text = unicodedata.normalize('NFKD', str(week_days)).encode('ascii', 'ignore').decode().lower()
+    tokens = re.findall(r'[a-z]+|\d', text)
+    wednesday_lettered = any(('x' in token or 'w' in token) and parse_day_code(token, True) is not None for token in tokens)
+    days, unknown = set(), []
+    for token in tokens:
+        if token.isdigit():
+            if 1 <= int(token) <= 7:
+                days.add(int(token) - 1)
+            else:
+                unknown.append(token)
+        elif token in WEEKDAY_NAMES:
+            days.add(WEEKDAY_NAMES[token])
+        elif token not in WEEKDAY_CONNECTIVES:
+            code_days = parse_day_code(token, wednesday_lettered)
+            if code_days is None:
+                unknown.append(token)
+            else:
+                days.update(code_days)
+    if unknown or not days:
+        raise ValueError(f"Unrecognized week days '{week_days}'" + (f": {', '.join(unknown)}" if unknown else ''))
+    return days
+
+
+def parse_time(value):
+    if isinstance(value, dt_time):
+        return value
+    try:
+        return datetime.strptime(str(value).strip()[:5], '%H:%M').time()
+    except ValueError:
+        return None
+
+
+def session_window(start_time, end_time, week_days, now):
+    # (start, end) datetimes of today's session, None when the class does not meet today. Raises ValueError when
+    # the schedule cannot be read.
+    start, end = parse_time(start_time), parse_time(end_time)
+    if start is None or end is None:
+        raise ValueError(f"Unrecognized session times '{start_time}' - '{end_time}'")
+    if now.weekday() not in parse_week_days(week_days):
+        return None
+    start_at = datetime.combine(now.date(), start)
+    end_at = datetime.combine(now.date(), end)
+    if end_at <= start_at:
+        end_at += timedelta(days=1)
+    return start_at, end_at
+
+
+class RosterScheduler:
+    """
+    Background thread that keeps class_rosters warm: from a few minutes before a class session starts until
+    its end plus a grace period, the roster is reloaded (from the shared embedding store when available) on
+    every pass, so check-in at the classroom door never pays a cold roster load and still sees enrollment
+    changes. Each copy lives at most ROSTER_CACHE_TTL, like the ones the identify route loads itself.
+    """
+
+    def __init__(self, interval=ROSTER_SCHEDULER_INTERVAL, prewarm_minutes=ROSTER_PREWARM_MINUTES, grace_minutes=ROSTER_GRACE_MINUTES):
+        self.interval = interval
+        self.prewarm = timedelta(minutes=prewarm_minutes)
+        self.grace = timedelta(minutes=grace_minutes)
+        self.thread = None
+        self.lock = threading.Lock()
+        # Unreadable schedules already logged, so each one is reported once and not on every pass
+        self.unreadable = set()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='roster-scheduler', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f'Roster pre-warm failed: {e}')  # Error log
+            time.sleep(self.interval)
+
+    def tick(self, now=None):
+        now = now or datetime.now()
+        class_rosters.purge_expired()
+
+        db_result = ClassesDatabase().get_class_schedules()
+        if not db_result['success']:
+            raise RuntimeError(db_result['error'])
+
+        for class_id, start_time, end_time, week_days in db_result['data']['schedules']:
+            try:
+                window = session_window(start_time, end_time, week_days, now)
+            except ValueError as e:
+                schedule = (class_id, str(start_time), str(end_time), str(week_days))
+                if schedule not in self.unreadable:
+                    self.unreadable.add(schedule)
+                    print(f'Roster pre-warm skips class {class_id}: {e}')  # Error log
+                continue
+            if window is None:
+                continue
+            start_at, end_at = window
+            evict_at = end_at + self.grace
+            if not start_at - self.prewarm <= now < evict_at:
+                continue
+
+            roster_result = FaceDatabase().get_class_roster(class_id)
+            if roster_result['success']:
+                ttl = min((evict_at - now).total_seconds(), ROSTER_CACHE_TTL)
+                class_rosters.set(str(class_id), roster_result['data']['roster'], ttl=ttl)
+
+
+_roster_scheduler = None
+_roster_scheduler_lock = threading.Lock()
+
+
+def get_roster_scheduler():
+    global _roster_scheduler
+    if _roster_scheduler is None:
+        with _roster_scheduler_lock:
+            if _roster_scheduler is None:
+                _roster_scheduler = RosterScheduler()
+    return _roster_scheduler
@@ -1,3 +1,4 @@
+import os
 from routes.face_routes.verify_face_route import verify_face_bp
 from routes.login_routes.student_signup_route import student_signup_bp
 from routes.login_routes.student_login_route import student_login_bp
@@ -5,6 +6,11 @@ from routes.login_routes.teacher_login_route import teacher_login_bp
 from routes.login_routes.teacher_signup_route import teacher_signup_bp
 from routes.login_routes.check_duplicate_route import check_duplicate_bp
 from routes.face_routes.check_face_route import check_face_bp
+from routes.face_routes.face_status_route import face_status_bp
+from routes.face_routes.identify_face_route import identify_face_bp
+from routes.face_routes.verify_face_batch_route import verify_face_batch_bp
+from routes.face_routes.identify_faculty_face_route import identify_faculty_face_bp
+from routes.face_routes.face_metrics_route import face_metrics_bp
 from routes.class_routes.register_class_route import register_class_bp
 from routes.class_routes.retrieve_teacher_classes_route import retrieve_teacher_classes_bp
 from routes.class_routes.update_class_route import update_class_bp
@@ -39,14 +45,27 @@ from routes.attendance_routes.modify_attendance_route import modify_attendance_b
 from routes.attendance_routes.delete_attendance_route import delete_attendance_bp
 from routes.teacher_routes.retrieve_teacher_exams_route import retrieve_teacher_exams_bp
 
-blueprints_list = [
+# 'all' serves every blueprint. 'core' leaves out the blueprints that run face inference (face routes and signup,
+# which embeds the reference face) so a worker group for class, exam and assignment CRUD never starts the face
+# engine; 'face' serves only those.
+DEPLOYMENT_MODE = os.environ.get('FACECHECK_DEPLOYMENT_MODE', 'all')
+
+face_blueprints_list = [
     (verify_face_bp, '/api'),
     (student_signup_bp, '/api'),
     (teacher_signup_bp, '/api'),
+    (check_face_bp, '/api'),
+    (face_status_bp, '/api'),
+    (identify_face_bp, '/api'),
+    (verify_face_batch_bp, '/api'),
+    (identify_faculty_face_bp, '/api'),
+    (face_metrics_bp, '/api'),
+]
+
+core_blueprints_list = [
     (student_login_bp, '/api'),
     (teacher_login_bp, '/api'),
     (check_duplicate_bp, '/api'),
-    (check_face_bp, '/api'),
     (register_class_bp, '/api'),
     (retrieve_teacher_classes_bp, '/api'),
     (update_class_bp, '/api'),
@@ -81,3 +100,9 @@ blueprints_list = [
     (delete_attendance_bp, '/api'),
     (retrieve_teacher_exams_bp, '/api')
 ]
+
+if DEPLOYMENT_MODE not in ('all', 'core', 'face'):
+    raise ValueError(f"Unknown deployment mode '{DEPLOYMENT_MODE}', expected one of: all, core, face")
+
+serves_face = DEPLOYMENT_MODE in ('all', 'face')
+blueprints_list = (face_blueprints_list if serves_face else []) + (core_blueprints_list if DEPLOYMENT_MODE != 'face' else [])
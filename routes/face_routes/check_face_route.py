@@ -1,14 +1,22 @@
-from flask import Blueprint, request, jsonify
-from modules.facecheck import FaceCheck, ImageProcessor
+from flask import Blueprint, jsonify
+from modules.facecheck import FaceQualityError, ImageProcessor
+from modules.face_worker_pool import get_face_pool
+from modules.face_errors import FACE_SERVICE_ERRORS, face_error_response
+from modules.face_uploads import read_face_request
+from modules.face_metrics import stage, timed_stages
+from modules.face_cache import face_crops, frame_token
 
 check_face_bp = Blueprint('check_face', __name__)
 
 @check_face_bp.route('/face/check-existing', methods=['POST'])
+@timed_stages('face_check')
 def check_face():
     try:
-        body = request.get_json()
+        # JSON with a base64 image, multipart/form-data or a raw application/octet-stream JPEG
+        with stage('parse'):
+            body = read_face_request('img')
 
-        img_base64 = body.get('img')
+        img_base64 = body.get('img') if body else None
 
         if not img_base64:
             return jsonify({
@@ -17,16 +25,32 @@ def check_face():
                 'status_code': 400
             }), 400
 
-        img = ImageProcessor.decode_base64(img_base64)
+        img, _ = ImageProcessor.decode_frame_reduced(img_base64)
 
-        face_exists = FaceCheck().face_exists(img)
+        # Keep the aligned crop so a following /face/verify of the same frame skips detection
+        try:
+            face_crop = get_face_pool().run('detect_captured_face', img)
+        except FaceQualityError as qe:
+            return jsonify({
+                'success': True,
+                'data': {'face_exists': False, 'face_token': None, 'reason': qe.reason},
+                'status_code': 200
+            }), 200
+
+        face_exists = face_crop is not None
+        face_token = None
+        if face_exists:
+            face_token = frame_token(img_base64)
+            face_crops.set(face_token, face_crop)
 
         return jsonify({
             'success': True,
-            'data': {'face_exists': face_exists},
+            'data': {'face_exists': face_exists, 'face_token': face_token, 'reason': None if face_exists else 'no_face'},
             'status_code': 200
         }), 200
 
+    except FACE_SERVICE_ERRORS as fe:
+        return face_error_response(fe)
     except ValueError as ve:
         return jsonify({
             'success': False,
@@ -0,0 +1,14 @@
+from flask import Blueprint, jsonify
+from modules.face_metrics import metrics
+from modules.database_modules.face_database import FaceDatabase
+
+face_metrics_bp = Blueprint('face_metrics', __name__)
+
+
+@face_metrics_bp.route('/face/metrics', methods=['GET'])
+def face_metrics():
+    return jsonify(FaceDatabase.generate_response(
+        success=True,
+        data=metrics.snapshot(),
+        status_code=200
+    )), 200
@@ -0,0 +1,18 @@
+from flask import Blueprint, jsonify
+from modules.face_worker_pool import get_face_pool
+from modules.database_modules.login_signup_database import LoginSignupDatabase
+
+face_status_bp = Blueprint('face_status', __name__)
+
+
+@face_status_bp.route('/face/status', methods=['GET'])
+def face_status():
+    status = get_face_pool().status()
+    status_code = 200 if status['ready'] else 503
+
+    return jsonify(LoginSignupDatabase.generate_response(
+        success=status['ready'],
+        error=None if status['ready'] else 'Face engine is not ready.',
+        data=status,
+        status_code=status_code
+    )), status_code
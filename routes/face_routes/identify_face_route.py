@@ -0,0 +1,82 @@
+from flask import Blueprint, request, jsonify
+from modules.facecheck import ImageProcessor
+from modules.face_worker_pool import get_face_pool
+from modules.face_errors import FACE_SERVICE_ERRORS, face_error_response
+from modules.face_cache import class_rosters
+from modules.database_modules.face_database import FaceDatabase
+
+identify_face_bp = Blueprint('identify_face', __name__)
+db = FaceDatabase()
+
+
+@identify_face_bp.route('/face/identify', methods=['POST'])
+def identify_face():
+    try:
+        body = request.get_json()
+
+        if not body:
+            return jsonify(FaceDatabase.generate_response(
+                success=False,
+                error='No JSON data provided.',
+                status_code=400
+            )), 400
+
+        cap_frame_base64 = body.get('cap_frame')
+        class_id = body.get('class_id')
+
+        if not cap_frame_base64 or not class_id:
+            return jsonify(FaceDatabase.generate_response(
+                success=False,
+                error='Both captured frame and class ID must be provided.',
+                status_code=400
+            )), 400
+
+        # Every enrolled student's embedding for the class as one matrix, usually pre-warmed before the session
+        roster = class_rosters.get(str(class_id))
+        if roster is None:
+            db_result = db.get_class_roster(class_id)
+            if not db_result['success']:
+                return jsonify(FaceDatabase.generate_response(
+                    success=False,
+                    error=db_result['error'],
+                    status_code=db_result['status_code']
+                )), db_result['status_code']
+            roster = db_result['data']['roster']
+            if not len(roster):
+                return jsonify(FaceDatabase.generate_response(
+                    success=False,
+                    error='No enrolled faces found for the class.',
+                    status_code=404
+                )), 404
+            class_rosters.set(str(class_id), roster)
+
+        cap_frame, _ = ImageProcessor.decode_base64_reduced(cap_frame_base64)
+        # One embedding on the inference pool, then one matrix-vector product over the roster here
+        cap_embedding = get_face_pool().run('compute_embedding', cap_frame)
+        best_match = roster.best_match(cap_embedding)
+
+        return jsonify(FaceDatabase.generate_response(
+            success=True,
+            data={
+                'match': best_match['match'],
+                'student_id': best_match['id'] if best_match['match'] else None,
+                'score': best_match['score'],
+                'distance': best_match['distance']
+            },
+            status_code=200
+        )), 200
+
+    except FACE_SERVICE_ERRORS as fe:
+        return face_error_response(fe)
+    except ValueError as ve:
+        return jsonify(FaceDatabase.generate_response(
+            success=False,
+            error=str(ve),
+            status_code=400
+        )), 400
+    except Exception as e:
+        return jsonify(FaceDatabase.generate_response(
+            success=False,
+            error=str(e),
+            status_code=500
+        )), 500
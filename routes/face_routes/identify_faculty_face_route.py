@@ -0,0 +1,82 @@
+from flask import Blueprint, request, jsonify
+from modules.facecheck import FaceCheck, ImageProcessor
+from modules.face_worker_pool import get_face_pool
+from modules.face_errors import FACE_SERVICE_ERRORS, face_error_response
+from modules.face_index import faculty_indexes
+from modules.database_modules.face_database import FaceDatabase
+
+identify_faculty_face_bp = Blueprint('identify_faculty_face', __name__)
+db = FaceDatabase()
+
+
+def load_faculty(faculty, after_face_id):
+    db_result = db.get_faculty_embeddings(faculty, after_face_id)
+    if not db_result['success']:
+        raise RuntimeError(db_result['error'])
+    data = db_result['data']
+    return data['student_ids'], data['embeddings'], data['last_face_id']
+
+
+@identify_faculty_face_bp.route('/face/identify/faculty', methods=['POST'])
+def identify_faculty_face():
+    try:
+        body = request.get_json()
+
+        if not body:
+            return jsonify(FaceDatabase.generate_response(
+                success=False,
+                error='No JSON data provided.',
+                status_code=400
+            )), 400
+
+        cap_frame_base64 = body.get('cap_frame')
+        faculty = body.get('faculty')
+        n_probe = body.get('n_probe')
+
+        if not cap_frame_base64 or not faculty:
+            return jsonify(FaceDatabase.generate_response(
+                success=False,
+                error='Both captured frame and faculty must be provided.',
+                status_code=400
+            )), 400
+
+        # Built from the database on first use, then caught up with signups from every worker and rebuilt
+        # periodically so faculty moves handled elsewhere are picked up
+        index = faculty_indexes.catch_up(faculty, lambda after_face_id: load_faculty(faculty, after_face_id))
+        if not len(index):
+            return jsonify(FaceDatabase.generate_response(
+                success=False,
+                error='No enrolled faces found for the faculty.',
+                status_code=404
+            )), 404
+
+        cap_frame, _ = ImageProcessor.decode_base64_reduced(cap_frame_base64)
+        cap_embedding = get_face_pool().run('compute_embedding', cap_frame)
+        neighbours = index.search(cap_embedding, k=1, n_probe=int(n_probe) if n_probe else None)
+        best_match = FaceCheck.match_result(*neighbours[0])
+
+        return jsonify(FaceDatabase.generate_response(
+            success=True,
+            data={
+                'match': best_match['match'],
+                'student_id': best_match['id'] if best_match['match'] else None,
+                'score': best_match['score'],
+                'distance': best_match['distance']
+            },
+            status_code=200
+        )), 200
+
+    except FACE_SERVICE_ERRORS as fe:
+        return face_error_response(fe)
+    except ValueError as ve:
+        return jsonify(FaceDatabase.generate_response(
+            success=False,
+            error=str(ve),
+            status_code=400
+        )), 400
+    except Exception as e:
+        return jsonify(FaceDatabase.generate_response(
+            success=False,
+            error=str(e),
+            status_code=500
+        )), 500
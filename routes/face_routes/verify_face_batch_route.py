@@ -0,0 +1,130 @@
+from flask import Blueprint, request, jsonify
+from modules.facecheck import FaceCheck, ImageProcessor
+from modules.face_worker_pool import get_face_pool
+from modules.face_errors import FACE_SERVICE_ERRORS, face_error_response
+from modules.face_cache import frame_token, verification_results
+from modules.database_modules.face_database import FaceDatabase
+
+verify_face_batch_bp = Blueprint('verify_face_batch', __name__)
+db = FaceDatabase()
+
+MAX_BATCH_SIZE = 32
+
+
+def parse_student_id(student_id):
+    try:
+        return int(student_id)
+    except (TypeError, ValueError):
+        return None
+
+
+@verify_face_batch_bp.route('/face/verify/batch', methods=['POST'])
+def verify_face_batch():
+    try:
+        body = request.get_json()
+        items = body.get('items') if body else None
+
+        if not items or not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return jsonify(FaceDatabase.generate_response(
+                success=False,
+                error='A non-empty list of items must be provided.',
+                status_code=400
+            )), 400
+
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify(FaceDatabase.generate_response(
+                success=False,
+                error=f'At most {MAX_BATCH_SIZE} items can be verified per request.',
+                status_code=400
+            )), 400
+
+        items = [{'cap_frame': item.get('cap_frame'), 'student_id': parse_student_id(item.get('student_id'))}
+                 for item in items]
+        results = [{'student_id': item['student_id'], 'match': None, 'error': None} for item in items]
+
+        # Fetch every reference face with a single query
+        student_ids = {item['student_id'] for item in items if item['student_id']}
+        db_result = db.get_faces_by_student_ids(list(student_ids))
+        if not db_result['success']:
+            return jsonify(FaceDatabase.generate_response(
+                success=False,
+                error=db_result['error'],
+                status_code=db_result['status_code']
+            )), db_result['status_code']
+        faces = db_result['data']
+
+        # Collect the frames to embed: every valid captured frame plus references that have no stored embedding yet
+        pending, keys = [], {}
+        for index, item in enumerate(items):
+            if not item['cap_frame'] or not item['student_id']:
+                results[index]['error'] = 'Both captured frame and student ID must be provided.'
+            elif item['student_id'] not in faces:
+                results[index]['error'] = 'Face image not found for the student'
+            else:
+                # Same key as /face/verify, so retries hit the cache from either endpoint
+                key = (frame_token(item['cap_frame']), faces[item['student_id']]['face_hash'])
+                cached = verification_results.get(key)
+                if cached is not None:
+                    results[index]['match'] = cached[0]
+                else:
+                    keys[index] = key
+                    pending.append(index)
+
+        cap_frames = ImageProcessor.decode_base64_many([items[index]['cap_frame'] for index in pending])
+        missing_refs = [index for index in pending if faces[items[index]['student_id']]['face_embedding'] is None]
+        ref_frames = ImageProcessor.decode_base64_many(
+            [faces[items[index]['student_id']]['face_img_base64'] for index in missing_refs]
+        )
+
+        to_embed = []
+        for index, cap_frame in zip(pending, cap_frames):
+            if cap_frame is None:
+                results[index]['error'] = 'Invalid captured frame.'
+            else:
+                to_embed.append(('cap', index, cap_frame))
+        for index, ref_frame in zip(missing_refs, ref_frames):
+            if ref_frame is not None:
+                to_embed.append(('ref', index, ref_frame))
+
+        # Embed everything in one batch
+        embeddings = get_face_pool().run('compute_embeddings', [frame for _, _, frame in to_embed])
+        cap_embeddings, ref_embeddings = {}, {}
+        for (kind, index, _), embedding in zip(to_embed, embeddings):
+            (cap_embeddings if kind == 'cap' else ref_embeddings)[index] = embedding
+
+        for index in pending:
+            if results[index]['error']:
+                continue
+            ref_embedding = faces[items[index]['student_id']]['face_embedding']
+            if ref_embedding is None:
+                ref_embedding = ref_embeddings.get(index)
+            cap_embedding = cap_embeddings.get(index)
+
+            if cap_embedding is None or ref_embedding is None:
+                match, tier = 'VALUE ERROR', None
+            else:
+                # Batches always compare with the accurate model
+                match, tier = FaceCheck.embeddings_match(cap_embedding, ref_embedding), 'accurate'
+            results[index]['match'] = match
+            verification_results.set(keys[index], (match, tier))
+
+        return jsonify(FaceDatabase.generate_response(
+            success=True,
+            data={'results': results},
+            status_code=200
+        )), 200
+
+    except FACE_SERVICE_ERRORS as fe:
+        return face_error_response(fe)
+    except ValueError as ve:
+        return jsonify(FaceDatabase.generate_response(
+            success=False,
+            error=str(ve),
+            status_code=400
+        )), 400
+    except Exception as e:
+        return jsonify(FaceDatabase.generate_response(
+            success=False,
+            error=str(e),
+            status_code=500
+        )), 500
@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify
-from modules.facecheck import FaceCheck, ImageProcessor
+from flask import Blueprint, jsonify
+from modules.facecheck import ImageProcessor
+from modules.face_worker_pool import get_face_pool, get_verify_batcher
+from modules.face_errors import FACE_SERVICE_ERRORS, face_error_response
+from modules.face_uploads import read_face_request
+from modules.face_metrics import stage, timed_stages
+from modules.face_cache import face_crops, frame_token, verification_results
 from modules.database_modules.login_signup_database import LoginSignupDatabase
 import base64
 
 verify_face_bp = Blueprint('verify_face', __name__)
 
+MAX_BURST_FRAMES = 5
+
 
 def decode_images(cap_frame_base64, ref_frame_base64):
     if not cap_frame_base64:
@@ -14,22 +21,81 @@ def decode_images(cap_frame_base64, ref_frame_base64):
         raise ValueError("Missing reference frame data")
 
     try:
-        cap_frame = ImageProcessor.decode_base64(cap_frame_base64)
-        ref_frame = ImageProcessor.decode_base64(ref_frame_base64)
+        cap_frame, _ = ImageProcessor.decode_frame_reduced(cap_frame_base64)
+        ref_frame, _ = ImageProcessor.decode_frame_reduced(ref_frame_base64)
         return cap_frame, ref_frame
     except Exception as e:
         raise
 
 
+def verify_burst(cap_frames_base64, ref_frame_base64, student_id):
+    # Several captured frames in one request: the engine tries them sharpest first and stops at the first clear match
+    if not isinstance(cap_frames_base64, list) or not cap_frames_base64 or not (ref_frame_base64 or student_id):
+        return jsonify(LoginSignupDatabase.generate_response(
+            success=False,
+            error='A non-empty list of captured frames and either reference frame or student ID must be provided.',
+            status_code=400
+        )), 400
+
+    if len(cap_frames_base64) > MAX_BURST_FRAMES:
+        return jsonify(LoginSignupDatabase.generate_response(
+            success=False,
+            error=f'At most {MAX_BURST_FRAMES} captured frames can be sent per request.',
+            status_code=400
+        )), 400
+
+    ref_embedding = None
+    if ref_frame_base64:
+        ref_hash = frame_token(ref_frame_base64)
+    else:
+        with stage('db_fetch'):
+            db_result = LoginSignupDatabase().get_face_by_student_id(student_id)
+        if not db_result['success']:
+            return jsonify(LoginSignupDatabase.generate_response(
+                success=False,
+                error=db_result['error'],
+                status_code=db_result['status_code']
+            )), db_result['status_code']
+        ref_frame_base64 = db_result['data']['face_img_base64']
+        ref_embedding = db_result['data']['face_embedding']
+        ref_hash = db_result['data']['face_hash']
+
+    burst_key = (frame_token(''.join(frame_token(frame) for frame in cap_frames_base64)), ref_hash)
+    cached = verification_results.get(burst_key)
+    if cached is not None:
+        face_match, frames_used = cached
+    else:
+        cap_frames = [frame for frame in ImageProcessor.decode_base64_many(cap_frames_base64) if frame is not None]
+        if not cap_frames:
+            raise ValueError('None of the captured frames could be decoded.')
+        ref_frame = None
+        if ref_embedding is None:
+            ref_frame, _ = ImageProcessor.decode_frame_reduced(ref_frame_base64)
+
+        face_match, frames_used = get_face_pool().run('check_match_burst', cap_frames, ref_embedding, ref_frame)
+        verification_results.set(burst_key, (face_match, frames_used))
+
+    # Bursts skip the cascade, their early exit already keeps the number of embeddings low
+    tier = 'accurate' if face_match != 'VALUE ERROR' else None
+    return jsonify(LoginSignupDatabase.generate_response(
+        success=True,
+        data={'match': face_match, 'tier': tier, 'frames_used': frames_used},
+        status_code=200
+    )), 200
+
+
 @verify_face_bp.route('/face/verify', methods=['POST'])
+@timed_stages('face_verify')
 def verify_face():
     try:
-        body = request.get_json()
+        # JSON with base64 frames, multipart/form-data or a raw application/octet-stream JPEG
+        with stage('parse'):
+            body = read_face_request('cap_frame', list_fields=('cap_frames',))
 
         if not body:
             return jsonify(LoginSignupDatabase.generate_response(
                 success=False,
-                error='No JSON data provided.',
+                error='No request data provided.',
                 status_code=400
             )), 400
 
@@ -37,21 +103,36 @@ def verify_face():
         ref_frame_base64 = body.get('ref_frame')
         student_id = body.get('student_id')
 
+        # Burst of frames from one check-in, replaces several single-frame retries
+        if body.get('cap_frames') is not None:
+            return verify_burst(body.get('cap_frames'), ref_frame_base64, student_id)
+
+        # Crop left by /face/check-existing for the same frame, looked up by explicit token or by the frame itself
+        cap_token = frame_token(cap_frame_base64) if cap_frame_base64 else None
+        face_token = body.get('face_token') or cap_token
+        cap_crop = face_crops.get(face_token) if face_token else None
+
         # Case 1: Both cap_frame and ref_frame are provided directly
         if cap_frame_base64 and ref_frame_base64:
-            cap_frame, ref_frame = decode_images(cap_frame_base64, ref_frame_base64)
-            face_match = FaceCheck().check_match(cap_frame, ref_frame)
+            def compare():
+                cap_frame, ref_frame = decode_images(cap_frame_base64, ref_frame_base64)
+                return get_face_pool().run('check_match', cap_frame, ref_frame)
+
+            # Client retries of the same pair of frames reuse the earlier result; the crop is never used here,
+            # so the key is the captured frame itself and not the client's face_token
+            face_match, tier = verification_results.get_or_compute((cap_token, frame_token(ref_frame_base64)), compare)
 
             return jsonify(LoginSignupDatabase.generate_response(
                 success=True,
-                data={'match': face_match},
+                data={'match': face_match, 'tier': tier},
                 status_code=200
             )), 200
 
-        # Case 2: cap_frame and student_id are provided
-        elif cap_frame_base64 and student_id:
+        # Case 2: cap_frame (or the face_token of an already checked frame) and student_id are provided
+        elif (cap_frame_base64 or cap_crop is not None) and student_id:
             # Get reference face from the database
-            db_result = LoginSignupDatabase().get_face_by_student_id(student_id)
+            with stage('db_fetch'):
+                db_result = LoginSignupDatabase().get_face_by_student_id(student_id)
 
             if not db_result['success']:
                 return jsonify(LoginSignupDatabase.generate_response(
@@ -61,26 +142,52 @@ def verify_face():
                 )), db_result['status_code']
 
             ref_frame_base64 = db_result['data']['face_img_base64']
+            ref_embedding = db_result['data']['face_embedding']
+            face_hash = db_result['data']['face_hash']
 
-            # Decode both images
-            cap_frame, ref_frame = decode_images(cap_frame_base64, ref_frame_base64)
-
-            # Compare faces
-            face_match = FaceCheck().check_match(cap_frame, ref_frame)
+            if ref_embedding is None and not cap_frame_base64:
+                return jsonify(LoginSignupDatabase.generate_response(
+                    success=False,
+                    error='Captured frame must be provided for students without a stored face embedding.',
+                    status_code=400
+                )), 400
+
+            # Results are keyed by what is actually compared: the face_token only stands for the cached crop, an
+            # expired crop or a student without a stored embedding means the captured frame is used instead
+            uses_crop = ref_embedding is not None and cap_crop is not None
+
+            def compare():
+                # Concurrent requests against stored embeddings are micro-batched into shared forward passes
+                if uses_crop:
+                    # Detection and alignment already happened in /face/check-existing
+                    return get_verify_batcher().submit((cap_crop, ref_embedding, face_hash, ref_frame_base64))
+                elif ref_embedding is not None:
+                    # Compare the captured frame against the embedding stored at signup
+                    cap_frame, _ = ImageProcessor.decode_frame_reduced(cap_frame_base64)
+                    return get_verify_batcher().submit((cap_frame, ref_embedding, face_hash, ref_frame_base64))
+                else:
+                    # Decode both images and compare faces
+                    cap_frame, ref_frame = decode_images(cap_frame_base64, ref_frame_base64)
+                    return get_face_pool().run('check_match', cap_frame, ref_frame)
+
+            # Client retries of the same frame reuse the earlier result; the face hash changes with the stored face
+            face_match, tier = verification_results.get_or_compute((face_token if uses_crop else cap_token, face_hash), compare)
 
             return jsonify(LoginSignupDatabase.generate_response(
                 success=True,
-                data={'match': face_match},
+                data={'match': face_match, 'tier': tier},
                 status_code=200
             )), 200
 
         else:
             return jsonify(LoginSignupDatabase.generate_response(
                 success=False,
-                error='Both captured frame and either reference frame or student ID must be provided.',
+                error='Both captured frame (or face token) and either reference frame or student ID must be provided.',
                 status_code=400
             )), 400
 
+    except FACE_SERVICE_ERRORS as fe:
+        return face_error_response(fe)
     except ValueError as ve:
         return jsonify(LoginSignupDatabase.generate_response(
             success=False,
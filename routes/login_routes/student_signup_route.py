@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from modules.database_modules.login_signup_database import LoginSignupDatabase
+from modules.face_errors import FACE_SERVICE_ERRORS, face_error_response
 import bcrypt
 
 student_signup_bp = Blueprint('student_signup', __name__)
@@ -44,6 +45,15 @@ def student_signup():
             status_code=201
         )), 201
 
+    except FACE_SERVICE_ERRORS as fe:
+        return face_error_response(fe)
+    except ValueError as ve:
+        # The face image could not be decoded
+        return jsonify(LoginSignupDatabase.generate_response(
+            success=False,
+            error=str(ve),
+            status_code=400
+        )), 400
     except Exception as e:
         print("Exception occurred:", str(e))  # Debugging print
         return jsonify(LoginSignupDatabase.generate_response(
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from modules.database_modules.login_signup_database import LoginSignupDatabase
+from modules.face_errors import FACE_SERVICE_ERRORS, face_error_response
 import bcrypt
 
 teacher_signup_bp = Blueprint('teacher_signup', __name__)
@@ -47,6 +48,15 @@ def teacher_signup():
             status_code=201
         )), 201
 
+    except FACE_SERVICE_ERRORS as fe:
+        return face_error_response(fe)
+    except ValueError as ve:
+        # The face image could not be decoded
+        return jsonify(LoginSignupDatabase.generate_response(
+            success=False,
+            error=str(ve),
+            status_code=400
+        )), 400
     except Exception as e:
         print("Exception occurred:", str(e))
         return jsonify(LoginSignupDatabase.generate_response(
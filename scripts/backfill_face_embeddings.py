@@ -0,0 +1,200 @@
+"""
+Compute the missing face_embedding templates of faces_students / faces_teachers while the API keeps running.
+With --recompute-stale, templates of another model than MODEL_NAME (or in no template format at all) are
+recomputed as well, since rosters and identification indexes skip them.
+
+Rows are streamed through a server-side cursor in chunks, embedded on a pool of inference processes and written
+back with one batched UPDATE per chunk. The last written face_id of every table is kept in a checkpoint file, so
+an interrupted run continues where it stopped. Faces that cannot be decoded or detected are appended to a CSV so
+they can be captured again.
+
+Usage:
+    python -m scripts.backfill_face_embeddings --tables students teachers --workers 4 --chunk-size 128
+    python -m scripts.backfill_face_embeddings --recompute-stale
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from psycopg2.extras import execute_values
+from modules.facecheck import MODEL_NAME, FaceCheck, ImageProcessor, get_face_engine
+from modules.face_templates import MODEL_IDS, TEMPLATE_DTYPES, TEMPLATE_HEADER
+from modules.database_modules.face_database import db_connection, load_credentials
+
+# Table, owner column
+FACE_TABLES = {
+    'students': ('faces_students', 'student_id'),
+    'teachers': ('faces_teachers', 'teacher_id'),
+}
+
+
+def init_worker():
+    get_face_engine().warmup()
+
+
+def embed_chunk(rows):
+    # Runs in an inference process: [(face_id, owner_id, face_img)] -> [(face_id, owner_id, template, error)]
+    images, errors = [], []
+    for _, _, face_img in rows:
+        try:
+            images.append(ImageProcessor.decode_base64_reduced(face_img)[0])
+            errors.append(None)
+        except ValueError as e:
+            images.append(None)
+            errors.append(f'decode: {e}')
+
+    # One batched forward pass for every decodable image of the chunk
+    embeddings = iter(get_face_engine().compute_embeddings([image for image in images if image is not None]))
+    chunk = []
+    for (face_id, owner_id, _), image, error in zip(rows, images, errors):
+        embedding = next(embeddings) if image is not None else None
+        if embedding is None:
+            chunk.append((face_id, owner_id, None, error or 'no_face'))
+        else:
+            chunk.append((face_id, owner_id, FaceCheck.serialize_embedding(embedding), None))
+    return chunk
+
+
+def load_checkpoint(path):
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_checkpoint(path, checkpoint):
+    # Written to a temporary file first so a crash never leaves a truncated checkpoint
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(temporary_path, path)
+
+
+def read_chunks(conn, table, owner_column, after_face_id, chunk_size, recompute_stale=False):
+    # Yields [(face_id, owner_id, face_img, stored template)]. Named cursor: PostgreSQL keeps the result set
+    # server-side and sends chunk_size rows per round trip
+    condition = 'face_embedding IS NULL'
+    parameters = (after_face_id,)
+    if recompute_stale:
+        # Current templates start with a known version byte followed by MODEL_NAME's id (see face_templates.py)
+        condition = """(face_embedding IS NULL OR length(face_embedding) < %s
+            OR get_byte(face_embedding, 0) <> ALL(%s) OR get_byte(face_embedding, 1) <> %s)"""
+        parameters = (TEMPLATE_HEADER.size, list(TEMPLATE_DTYPES), MODEL_IDS[MODEL_NAME], after_face_id)
+
+    cur = conn.cursor(name=f'backfill_{table}')
+    cur.itersize = chunk_size
+    cur.execute(f"""
+        SELECT face_id, {owner_column}, face_img, face_embedding
+        FROM {table}
+        WHERE {condition} AND face_img IS NOT NULL AND face_id > %s
+        ORDER BY face_id;
+    """, parameters)
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [(face_id, owner_id, bytes(face_img), bytes(template) if template is not None else None)
+                   for face_id, owner_id, face_img, template in rows]
+    finally:
+        cur.close()
+
+
+def write_chunk(conn, table, chunk, previous):
+    # One UPDATE for the whole chunk, only rows still holding the template that was read (previous, by face_id)
+    # so a concurrent signup is never overwritten
+    values = [(face_id, template, previous[face_id]) for face_id, _, template, _ in chunk if template is not None]
+    if values:
+        cur = conn.cursor()
+        execute_values(cur, f"""
+            UPDATE {table} AS f
+            SET face_embedding = v.face_embedding
+            FROM (VALUES %s) AS v(face_id, face_embedding, previous_embedding)
+            WHERE f.face_id = v.face_id AND f.face_embedding IS NOT DISTINCT FROM v.previous_embedding;
+        """, values, template='(%s, %s, %s::bytea)', page_size=len(values))
+        cur.close()
+    conn.commit()
+    return len(values)
+
+
+def backfill_table(name, args, executor, checkpoint, failures):
+    table, owner_column = FACE_TABLES[name]
+    # Stale scans cover more rows than the NULL-only ones, so they keep their own position
+    checkpoint_key = f'{table}:stale' if args.recompute_stale else table
+    after_face_id = checkpoint.get(checkpoint_key, 0)
+    processed = embedded = failed = 0
+    started = time.monotonic()
+    print(f'{table}: resuming after face_id {after_face_id}' if after_face_id else f'{table}: starting')
+
+    with db_connection(args.credentials) as reader, db_connection(args.credentials) as writer:
+        in_flight = deque()
+
+        def drain_one():
+            nonlocal processed, embedded, failed
+            future, previous = in_flight.popleft()
+            chunk = future.result()
+            embedded += write_chunk(writer, table, chunk, previous)
+            for face_id, owner_id, template, error in chunk:
+                if error:
+                    failed += 1
+                    failures.writerow([table, face_id, owner_id, error])
+            processed += len(chunk)
+
+            # Chunks are drained in order, so everything up to the last face_id is written
+            checkpoint[checkpoint_key] = chunk[-1][0]
+            save_checkpoint(args.checkpoint, checkpoint)
+
+            elapsed = time.monotonic() - started
+            print(f'{table}: {processed} rows, {embedded} embedded, {failed} failed, {processed / elapsed:.1f} rows/s')
+
+        for rows in read_chunks(reader, table, owner_column, after_face_id, args.chunk_size, args.recompute_stale):
+            # Only the images travel to the inference processes, the stored templates stay here for the UPDATE
+            previous = {face_id: template for face_id, _, _, template in rows}
+            in_flight.append((executor.submit(embed_chunk, [row[:3] for row in rows]), previous))
+            # Bounded read-ahead keeps every worker busy without pulling the whole table into memory
+            if len(in_flight) >= args.workers * 2:
+                drain_one()
+        while in_flight:
+            drain_one()
+
+    return processed, embedded, failed, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', nargs='+', choices=list(FACE_TABLES), default=list(FACE_TABLES))
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument('--chunk-size', type=int, default=128)
+    parser.add_argument('--checkpoint', default='backfill_checkpoint.json')
+    parser.add_argument('--failures', default='backfill_failures.csv')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and scan every table again')
+    parser.add_argument('--recompute-stale', action='store_true',
+                        help=f'also recompute templates that are not {MODEL_NAME} templates')
+    parser.add_argument('--credentials-path', default='modules/database_modules/credentials.json')
+    args = parser.parse_args()
+    args.credentials = load_credentials(args.credentials_path)
+
+    checkpoint = {} if args.restart else load_checkpoint(args.checkpoint)
+    totals = [0, 0, 0, 0.0]
+    with open(args.failures, 'a', newline='') as failures_file, ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker
+    ) as executor:
+        failures = csv.writer(failures_file)
+        for name in args.tables:
+            for index, value in enumerate(backfill_table(name, args, executor, checkpoint, failures)):
+                totals[index] += value
+            failures_file.flush()
+
+    processed, embedded, failed, elapsed = totals
+    print(f'Done: {processed} rows in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} rows/s), '
+          f'{embedded} embedded, {failed} logged to {args.failures}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Import-time budget for the light deployment: imports the app in a fresh interpreter with
+FACECHECK_DEPLOYMENT_MODE=core and fails (exit code 1) when the face stack leaks into that path or the
+import takes longer than the budget. Meant to run in CI next to the app's own dependencies.
+
+Usage:
+    python -m scripts.check_import_budget --budget 3.0
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules that must never be imported by a worker that does not serve face inference
+HEAVY_MODULES = ('deepface', 'tensorflow', 'keras', 'tf_keras', 'torch')
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module, mode):
+    env = dict(os.environ, FACECHECK_DEPLOYMENT_MODE=mode)
+    completed = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE.format(module=module)],
+        env=env, capture_output=True, text=True, check=True
+    )
+    # The app prints while importing, the probe's JSON is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--mode', default='core')
+    parser.add_argument('--budget', type=float, default=3.0, help='seconds')
+    args = parser.parse_args()
+
+    result = measure_import(args.module, args.mode)
+    leaked = [name for name in result['modules'] if name.split('.')[0] in HEAVY_MODULES]
+    leaked_roots = sorted({name.split('.')[0] for name in leaked})
+    print(f"import {args.module} ({args.mode}): {result['seconds']:.2f}s, budget {args.budget:.2f}s")
+
+    failed = False
+    if leaked_roots:
+        print(f"Face stack imported on the light path: {', '.join(leaked_roots)}")
+        failed = True
+    if result['seconds'] > args.budget:
+        print('Import time over budget')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()